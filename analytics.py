@@ -0,0 +1,163 @@
+"""Analytics do painel: visitas em write-behind e contadores diários (rollups).
+
+As visitas ficam num buffer em memória por worker e são gravadas em lote por uma
+thread: a cada VISIT_FLUSH_INTERVAL segundos, quando o buffer passa de
+VISIT_FLUSH_SIZE ou no encerramento do processo. O request nunca espera a escrita.
+
+Leads, pedidos, avaliações e sessões de chat alimentam ``DailyStat`` no mesmo
+flush em que são inseridos/removidos, então o dashboard só lê os contadores.
+Do mesmo jeito, ``ReviewStats`` guarda quantas avaliações visíveis há com cada
+número de estrelas: a nota média e o histograma saem de cinco linhas.
+"""
+import atexit
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event, func, insert, inspect, literal, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from models import db, upsert_increment, Visit, VisitDaily, DailyStat, Lead, Order, Review, ReviewStats, ChatSession
+
+# métrica -> (modelo, coluna de data)
+ROLLUP_SOURCES = {
+    'visits': (Visit, 'date'),
+    'leads': (Lead, 'data'),
+    'orders': (Order, 'data'),
+    'reviews': (Review, 'data'),
+    'chats': (ChatSession, 'created_at'),
+}
+ROLLUP_RANGES = (7, 30, 90, 365)
+_TRACKED = {m: (metric, col) for metric, (m, col) in ROLLUP_SOURCES.items() if m is not Visit}
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_rollups(session, flush_context):
+    delta = Counter()
+    for sinal, objs in ((1, session.new), (-1, session.deleted)):
+        for obj in objs:
+            fonte = _TRACKED.get(type(obj))
+            if fonte:
+                quando = getattr(obj, fonte[1]) or datetime.now()
+                delta[(fonte[0], quando.date())] += sinal
+    rows = [{'metric': m, 'day': d, 'count': n} for (m, d), n in delta.items() if n]
+    if rows: upsert_increment(DailyStat, ['metric', 'day'], rows, conn=session.connection())
+
+
+def _committed(obj, campo):
+    """Valor de ``campo`` antes das mudanças ainda não gravadas."""
+    h = inspect(obj).attrs[campo].history
+    return (h.deleted or h.unchanged or [getattr(obj, campo)])[0]
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_review_stats(session, flush_context):
+    delta = Counter()
+    for obj in session.new:
+        if isinstance(obj, Review) and obj.visivel: delta[obj.estrelas] += 1
+    for obj in session.dirty:
+        if isinstance(obj, Review):
+            antes, depois = (_committed(obj, 'visivel'), _committed(obj, 'estrelas')), (obj.visivel, obj.estrelas)
+            if antes == depois: continue
+            if antes[0]: delta[antes[1]] -= 1
+            if depois[0]: delta[depois[1]] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Review) and _committed(obj, 'visivel'): delta[_committed(obj, 'estrelas')] -= 1
+    rows = [{'stars': e, 'count': n} for e, n in delta.items() if n and e is not None]
+    if rows: upsert_increment(ReviewStats, ['stars'], rows, conn=session.connection())
+
+
+def review_summary():
+    """Resumo das avaliações visíveis: {count, sum, average, histogram {5..1: n}}."""
+    hist = dict(db.session.query(ReviewStats.stars, ReviewStats.count).all())
+    total, soma = sum(hist.values()), sum(e * n for e, n in hist.items())
+    return {'count': total, 'sum': soma, 'average': round(soma / total, 1) if total else None,
+            'histogram': {e: hist.get(e, 0) for e in range(5, 0, -1)}}
+
+
+def rollup_totals():
+    """Total de cada métrica (soma dos contadores diários)."""
+    totais = dict(db.session.query(DailyStat.metric, func.sum(DailyStat.count)).group_by(DailyStat.metric).all())
+    return {m: totais.get(m) or 0 for m in ROLLUP_SOURCES}
+
+
+def rollup_series(metric, days):
+    """Lista [(dia, contagem)] dos últimos ``days`` dias, com zero nos dias sem registro."""
+    hoje = date.today()
+    inicio = hoje - timedelta(days=days - 1)
+    linhas = dict(db.session.query(DailyStat.day, DailyStat.count).filter(DailyStat.metric == metric, DailyStat.day >= inicio).all())
+    return [(d, linhas.get(d, 0)) for d in (inicio + timedelta(days=i) for i in range(days))]
+
+
+def rebuild_rollups():
+    """Recalcula DailyStat, VisitDaily e ReviewStats a partir das tabelas brutas."""
+    db.session.query(DailyStat).delete()
+    db.session.query(VisitDaily).delete()
+    db.session.query(ReviewStats).delete()
+    db.session.execute(insert(ReviewStats).from_select(['stars', 'count'], select(Review.estrelas, func.count())
+                                                       .where(Review.visivel == True, Review.estrelas.isnot(None)).group_by(Review.estrelas)))
+    for metric, (model, col) in ROLLUP_SOURCES.items():
+        coluna = getattr(model, col)
+        dia = func.date(coluna)
+        db.session.execute(insert(DailyStat).from_select(['metric', 'day', 'count'], select(literal(metric), dia, func.count()).where(coluna.isnot(None)).group_by(dia)))
+    pagina = func.coalesce(Visit.page, 'home')
+    db.session.execute(insert(VisitDaily).from_select(['page', 'day', 'count'], select(pagina, func.date(Visit.date), func.count()).where(Visit.date.isnot(None)).group_by(pagina, func.date(Visit.date))))
+    db.session.commit()
+
+
+class VisitRecorder:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._buffer = []
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get('VISIT_FLUSH_INTERVAL', 5)
+        self.size = app.config.get('VISIT_FLUSH_SIZE', 500)
+        app.extensions['visits'] = self
+        atexit.register(self.flush)
+
+    def record(self, page):
+        with self._lock:
+            self._buffer.append((page, datetime.utcnow()))
+            cheio = len(self._buffer) >= self.size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='visit-flusher', daemon=True)
+                self._thread.start()
+        if cheio: self._wake.set()
+
+    def pending(self):
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self):
+        """Grava o buffer atual: linhas brutas em Visit e contagem diária em VisitDaily."""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if not batch: return 0
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(Visit), [{'page': p, 'date': d} for p, d in batch])
+                por_dia = Counter((p, d.date()) for p, d in batch)
+                upsert_increment(VisitDaily, ['page', 'day'], [{'page': p, 'day': day, 'count': n} for (p, day), n in por_dia.items()])
+                por_data = Counter(d.date() for _, d in batch)
+                upsert_increment(DailyStat, ['metric', 'day'], [{'metric': 'visits', 'day': day, 'count': n} for day, n in por_data.items()])
+                db.session.commit()
+            except SQLAlchemyError as e:
+                db.session.rollback()
+                self.app.logger.warning(f"Falha ao gravar {len(batch)} visitas: {e}")
+                return 0
+            finally:
+                db.session.remove()
+        return len(batch)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
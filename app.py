@@ -1,38 +1,69 @@
 import os
 import uuid
 import json
-from datetime import datetime, timedelta
-from threading import Thread
-from flask import Flask,current_app, render_template, request, jsonify, redirect, url_for, flash, abort
+import time
+import sqlite3
+import hmac
+import click
+from datetime import datetime
+from flask import Flask,current_app, render_template, request, jsonify, redirect, url_for, flash, abort, stream_with_context, send_from_directory
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask_migrate import Migrate
-from flask_mail import Mail, Message
+from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
-from sqlalchemy import or_, func
+from sqlalchemy import or_, func, tuple_, literal, insert
+from sqlalchemy.orm import joinedload
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_talisman import Talisman
 
 from config import Config
-from models import db, User, Lead, Order, Review, ChatSession, ChatMessage, Visit, ClientPlan, ClientStat, PublicPlan, PortfolioItem, SiteConfig
+from models import db, User, Lead, Order, Review, ChatSession, ChatMessage, ChatArchive, ClientPlan, ClientStat, PublicPlan, PortfolioItem, SiteConfig, ImportJob, ClientMetricMonthly
 from forms import LoginForm
+from chat_events import ChatEvents
+from query_check import check_query_plans, time_queries
+from datagen import generate_data
+from mailer import MailQueue
+from uploads import UploadStore, sign_upload, unsign_upload
+from page_cache import PageCache
+from assets import Assets
+from compression import CompressMiddleware, no_compress
+from metrics import Metrics
+from user_cache import UserCache
+from imports import IMPORTS, ImportQueue
+from exports import EXPORTS, FORMATS, csv_stream, export_rows, parse_range
+from timeseries import series, monthly, rebuild_monthly
+import search
+import chat_archive
+import chat_inbox
+from analytics import VisitRecorder, ROLLUP_RANGES, rollup_series, rollup_totals, rebuild_rollups, review_summary
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
+app.wsgi_app = CompressMiddleware(app.wsgi_app, min_size=app.config['COMPRESS_MIN_SIZE'], level=app.config['COMPRESS_LEVEL'])
 
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg', 'pdf', 'doc', 'docx'}
 if not os.path.exists(app.config['UPLOAD_FOLDER']): os.makedirs(app.config['UPLOAD_FOLDER'])
 
 db.init_app(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, include_object=search.include_object)
 mail = Mail(app)
+mail_queue = MailQueue(mail, app)
 csrf = CSRFProtect(app)
+chat_events = ChatEvents(app)
+visits = VisitRecorder(app)
+uploads = UploadStore(app)
+page_cache = PageCache(app)
+assets = Assets(app)
+metrics = Metrics(app)
+user_cache = UserCache(app)
+imports = ImportQueue(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -74,8 +105,91 @@ def configurar_site():
     except Exception as e:
         return f"Erro: {str(e)}"
 
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recalcula os contadores diários do dashboard e os agregados mensais dos clientes."""
+    visits.flush()
+    rebuild_rollups()
+    rebuild_monthly()
+    print("Rollups recalculados:", rollup_totals())
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Recria o índice de busca (FTS5 / tsvector) a partir de leads, chats e avaliações."""
+    inicio = time.monotonic()
+    print(f"{search.rebuild()} documento(s) indexado(s) em {time.monotonic() - inicio:.1f} s.")
+
+@app.cli.command('archive-chats')
+@click.option('--days', type=int, default=None, help='Encerradas há mais de N dias (padrão: CHAT_ARCHIVE_AFTER_DAYS).')
+def archive_chats_command(days):
+    """Move as mensagens das conversas encerradas há tempo para o arquivo comprimido."""
+    sessoes, mensagens = chat_archive.archive(days if days is not None else app.config['CHAT_ARCHIVE_AFTER_DAYS'], app.config['CHAT_ARCHIVE_BATCH_SIZE'])
+    print(f"{sessoes} sessão(ões) arquivada(s), {mensagens} mensagem(ns) fora da tabela quente.")
+
+@app.cli.command('send-mail')
+def send_mail_command():
+    """Esvazia a outbox agora (útil em cron ou para testar contra um SMTP local)."""
+    total = 0
+    while (n := mail_queue.process_batch()): total += n
+    print(f"{total} e-mail(s) processado(s).")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Minifica, aplica hash e pré-comprime os assets estáticos (static/dist)."""
+    for nome, final in assets.build().items(): print(f"{nome} -> dist/{final}")
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Falha se alguma consulta quente fizer varredura completa ou ordenação temporária."""
+    falhas = 0
+    for nome, (plano, problemas) in check_query_plans().items():
+        print(f"{'FALHA' if problemas else 'ok':5} {nome}")
+        for linha in plano: print(f"      {'!' if linha in problemas else ' '} {linha}")
+        falhas += bool(problemas)
+    if falhas: raise SystemExit(f"{falhas} consulta(s) sem índice adequado.")
+
+@app.cli.command('generate-data')
+@click.option('--users', default=100, help='Clientes (cada um com plano e 12 meses de estatísticas).')
+@click.option('--leads', default=10000)
+@click.option('--visits', default=100000)
+@click.option('--orders', default=2000)
+@click.option('--reviews', default=2000)
+@click.option('--sessions', default=5000, help='Sessões de chat.')
+@click.option('--messages', default=40, help='Média de mensagens por sessão.')
+@click.option('--metric-days', default=730, help='Dias da série temporal de cada cliente.')
+@click.option('--days', default=365, help='Período coberto pelas datas geradas.')
+@click.option('--batch-size', default=10000)
+@click.option('--seed', type=int, default=None)
+def generate_data_command(**opcoes):
+    """Popula o banco com dados sintéticos em escala (INSERT em lote)."""
+    inicio = time.monotonic()
+    def progresso(tabela, n):
+        if n % (opcoes['batch_size'] * 10) == 0: print(f"  {tabela}: {n}", flush=True)
+    for tabela, n in generate_data(progress=progresso, **opcoes).items():
+        print(f"{tabela:13} {n:>10} linhas")
+    print(f"Concluído em {time.monotonic() - inicio:.1f} s.")
+
+@app.cli.command('time-queries')
+@click.option('--repeat', default=5, help='Execuções por consulta.')
+@click.option('--slow', default=50.0, help='Limite (ms) para marcar a consulta como lenta.')
+def time_queries_command(repeat, slow):
+    """Mede as consultas quentes no banco atual (use depois do generate-data)."""
+    print(f"{'consulta':46} {'linhas':>7} {'melhor ms':>10} {'mediana ms':>11}")
+    for nome, (linhas, melhor, mediana) in time_queries(repeat=repeat).items():
+        print(f"{nome:46} {linhas:7} {melhor:10.2f} {mediana:11.2f}{'  LENTA' if mediana > slow else ''}")
+
+@app.cli.command('import-csv')
+@click.argument('kind', type=click.Choice(list(IMPORTS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+def import_csv_command(kind, path):
+    """Importa um CSV de clientes, métricas ou leads direto do disco (sem limite de upload)."""
+    job = imports.create(kind, os.path.abspath(path))
+    print(f"{job.status}: {job.imported} linha(s) importada(s), {job.failed} com erro.")
+    if job.last_error: print(job.last_error)
+    for e in json.loads(job.errors or '[]'): print(f"  linha {e['linha']}: {e['erro']}")
+
 @login_manager.user_loader
-def load_user(user_id): return db.session.get(User, int(user_id))
+def load_user(user_id): return user_cache.get(int(user_id), lambda i: db.session.get(User, i)) # retrato em cache (user_cache.py)
 
 def admin_required(f):
     def wrap(*args, **kwargs):
@@ -125,9 +239,10 @@ def logout():
 # --- SITE ---
 @app.route('/')
 def index():
-    try: db.session.add(Visit(page='home')); db.session.commit()
-    except: pass
-    
+    visits.record('home')
+    return page_cache.response('home', render_home)
+
+def render_home():
     plans = PublicPlan.query.order_by(PublicPlan.order_index).all()
     if plans:
         for p in plans:
@@ -138,13 +253,31 @@ def index():
     about_text = SiteConfig.query.filter_by(key='about_text').first()
     about_content = about_text.value if about_text else "Texto padrão..."
     
-    return render_template('index.html', plans=plans, portfolio=portfolio, about_content=about_content)
+    return render_template('index.html', plans=plans, portfolio=portfolio, about_content=about_content, rating=review_summary())
 
 @app.route('/termos-e-privacidade')
 def termos(): return render_template('legal.html') 
 
 @app.route('/avaliacoes')
-def reviews(): return render_template('reviews.html', reviews=Review.query.filter_by(visivel=True).order_by(Review.data.desc()).all())
+def reviews():
+    itens, proximo = keyset_page(Review.query.filter_by(visivel=True), (Review.data, Review.id), None, app.config['REVIEWS_PAGE_SIZE'])
+    return render_template('reviews.html', reviews=itens, next_cursor=proximo, rating=review_summary())
+
+@app.route('/avaliacoes/mais')
+def reviews_page():
+    """Próxima página da rolagem infinita de /avaliacoes: {html, next}."""
+    itens, proximo = keyset_page(Review.query.filter_by(visivel=True), (Review.data, Review.id), request.args.get('cursor'), app.config['REVIEWS_PAGE_SIZE'])
+    return jsonify({'html': render_template('review_cards.html', reviews=itens), 'next': proximo})
+
+# --- MÉTRICAS (Prometheus) ---
+@app.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    # scraper usa "Authorization: Bearer METRICS_TOKEN"; admin logado também pode ver
+    token = app.config.get('METRICS_TOKEN')
+    por_token = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    if not por_token and not (current_user.is_authenticated and current_user.role == 'admin'): abort(404)
+    return current_app.response_class(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 # --- ADMIN ROUTES ---
 @app.route('/admin')
@@ -154,10 +287,10 @@ def admin():
     tab = request.args.get('tab', 'dashboard')
     active_uuid = request.args.get('session_id')
     
-    last_7 = datetime.now() - timedelta(days=7)
-    leads_data = db.session.query(func.date(Lead.data), func.count(Lead.id)).filter(Lead.data >= last_7).group_by(func.date(Lead.data)).all()
-    chart_map = {(datetime.now() - timedelta(days=i)).strftime('%Y-%m-%d'): 0 for i in range(6, -1, -1)}
-    for d, c in leads_data: chart_map[str(d)] = c
+    dias = request.args.get('range', 7, type=int)
+    if dias not in ROLLUP_RANGES: dias = 7
+    serie = rollup_series('leads', dias)
+    totais = rollup_totals()
     
     chat_history = []
     active_ticket = ""
@@ -165,27 +298,88 @@ def admin():
         sess = ChatSession.query.filter_by(session_uuid=active_uuid).first()
         if sess: 
             chat_history = ChatMessage.query.filter_by(session_id=sess.id).order_by(ChatMessage.data).all()
+            if sess.archived_at: chat_history = chat_archive.read(sess.id) + chat_history
             active_ticket = sess.client_name
 
-    public_chats = ChatSession.query.filter(ChatSession.user_id == None).order_by(ChatSession.created_at.desc()).all()
-    client_chats = ChatSession.query.filter(ChatSession.user_id != None).order_by(ChatSession.created_at.desc()).all()
-    
-    for s in public_chats: s.uuid = s.session_uuid
-    for s in client_chats: s.uuid = s.session_uuid
-
     return render_template('admin.html', 
-        leads=Lead.query.order_by(Lead.data.desc()).all(),
-        reviews=Review.query.order_by(Review.data.desc()).all(),
-        clients=User.query.filter_by(role='client').all(),
-        orders=Order.query.order_by(Order.data.desc()).all(),
-        public_plans=PublicPlan.query.order_by(PublicPlan.order_index).all(),
-        portfolio=PortfolioItem.query.all(),
-        total_visits=Visit.query.count(), total_leads=Lead.query.count(), total_sales=Order.query.count(),
-        leads_chart=json.dumps({'labels': [datetime.strptime(d, '%Y-%m-%d').strftime('%d/%m') for d in chart_map.keys()], 'values': list(chart_map.values())}),
-        active_tab=tab, active_session=active_uuid, chat_history=chat_history, active_ticket=active_ticket,
-        public_chats=public_chats, client_chats=client_chats
+        total_visits=totais['visits'], total_leads=totais['leads'], total_sales=totais['orders'],
+        leads_chart=json.dumps({'labels': [d.strftime('%d/%m') for d, _ in serie], 'values': [n for _, n in serie]}), chart_range=dias, chart_ranges=ROLLUP_RANGES,
+        active_tab=tab, active_session=active_uuid, chat_history=chat_history, active_ticket=active_ticket
     )
 
+# Abas do admin: consulta base e colunas de ordenação (keyset); desc=False ordena crescente
+ADMIN_TABS = {
+    'leads': lambda: (Lead.query, (Lead.data, Lead.id), True),
+    'reviews': lambda: (Review.query, (Review.data, Review.id), True),
+    'orders': lambda: (Order.query, (Order.data, Order.id), True),
+    'clients': lambda: (User.query.filter_by(role='client').options(joinedload(User.plan_info)), (User.id,), True),
+    # caixa de entrada: conversas com atividade mais recente primeiro (chat_inbox.py)
+    'chat_public': lambda: (ChatSession.query.filter(ChatSession.user_id == None), (ChatSession.last_message_at, ChatSession.id), True),
+    'chat_client': lambda: (ChatSession.query.filter(ChatSession.user_id != None), (ChatSession.last_message_at, ChatSession.id), True),
+    'plans': lambda: (PublicPlan.query, (PublicPlan.order_index, PublicPlan.id), False),
+    'cases': lambda: (PortfolioItem.query, (PortfolioItem.id,), False),
+}
+
+def encode_cursor(values):
+    return '|'.join(v.isoformat() if isinstance(v, datetime) else str(v) for v in values)
+
+def decode_cursor(cursor, cols):
+    partes = cursor.split('|')
+    if len(partes) != len(cols): abort(400)
+    try: return [datetime.fromisoformat(p) if c.type.python_type is datetime else c.type.python_type(p) for p, c in zip(partes, cols)]
+    except ValueError: abort(400)
+
+def keyset_page(query, cols, cursor, size, desc=True):
+    """Uma página ordenada por ``cols``, começando depois da linha identificada por ``cursor``.
+
+    Devolve (itens, próximo cursor ou None).
+    """
+    if cursor:
+        chave = tuple_(*cols)
+        valores = tuple_(*[literal(v, c.type) for v, c in zip(decode_cursor(cursor, cols), cols)])
+        query = query.filter(chave < valores if desc else chave > valores)
+    itens = query.order_by(*[c.desc() if desc else c.asc() for c in cols]).limit(size + 1).all()
+    if len(itens) <= size: return itens, None
+    itens = itens[:size]
+    return itens, encode_cursor([getattr(itens[-1], c.key) for c in cols])
+
+@app.route('/admin/tab/<name>')
+@login_required
+@admin_required
+def admin_tab(name):
+    if name not in ADMIN_TABS: abort(404)
+    query, cols, desc = ADMIN_TABS[name]()
+    itens, proximo = keyset_page(query, cols, request.args.get('cursor'), app.config['ADMIN_PAGE_SIZE'], desc)
+    html = render_template('admin_tab.html', tab=name, itens=itens, active_session=request.args.get('session_id'))
+    return jsonify({'html': html, 'next': proximo})
+
+# --- BUSCA ---
+@app.route('/admin/search')
+@login_required
+@admin_required
+def admin_search():
+    kinds = [k for k in request.args.getlist('kind') if k in search.SOURCES] or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    resultados, mais = search.search(request.args.get('q', ''), kinds, page, app.config['SEARCH_PAGE_SIZE'], app.config['SEARCH_RANK_LIMIT'])
+    for r in resultados:
+        r['url'] = url_for('admin', tab=r.pop('tab'), session_id=r.pop('session_id', None))
+        r['date'] = r['date'].strftime('%d/%m/%Y %H:%M') if r['date'] else None
+    return jsonify({'results': resultados, 'next': page + 1 if mais else None})
+
+# --- EXPORTAÇÕES ---
+@app.route('/admin/export/<name>.<fmt>')
+@login_required
+@admin_required
+def admin_export(name, fmt):
+    if name not in EXPORTS or fmt not in FORMATS: abort(404)
+    try: inicio, fim = parse_range(request.args.get('inicio'), request.args.get('fim'))
+    except ValueError: abort(400)
+    gerar, mimetype = FORMATS[fmt]
+    header, rows = export_rows(name, inicio, fim)
+    # Em stream e sem Content-Length: as linhas saem enquanto são lidas do banco
+    return current_app.response_class(stream_with_context(gerar(header, rows)), mimetype=mimetype,
+                                      headers={'Content-Disposition': f'attachment; filename={name}_{datetime.now():%Y-%m-%d}.{fmt}'})
+
 # --- PLANOS ---
 @app.route('/admin/update_plan/<int:plan_id>', methods=['POST'])
 @login_required
@@ -214,10 +408,8 @@ def create_case():
     # Se tiver upload de arquivo, prioriza
     file = request.files.get('image_file')
     if file and file.filename != '' and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        unique_filename = f"case_{uuid.uuid4().hex}_{filename}"
-        file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-        image_url = url_for('static', filename=f'uploads/{unique_filename}')
+        path, _ = uploads.save(file, file.filename.rsplit('.', 1)[1])
+        image_url = uploads.url(path)
 
     db.session.add(PortfolioItem(title=title, description=desc, image_url=image_url))
     db.session.commit()
@@ -228,8 +420,12 @@ def create_case():
 @login_required
 @admin_required
 def delete_case(id):
-    PortfolioItem.query.filter_by(id=id).delete()
-    db.session.commit()
+    item = db.session.get(PortfolioItem, id)
+    if item:
+        path = uploads.path_from_url(item.image_url)
+        db.session.delete(item)
+        if path: uploads.release(path, commit=False)
+        db.session.commit()
     flash('Case removido.')
     return redirect(url_for('admin', tab='cases'))
 
@@ -244,32 +440,39 @@ def submit_lead():
         projeto = request.form.get('projeto')
         
         arquivo_nome = None
+        anexos, link_arquivo = [], None
         file = request.files.get('arquivo')
         if file and file.filename != '' and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            unique_filename = f"{uuid.uuid4().hex}_{filename}"
-            file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-            arquivo_nome = unique_filename
+            arquivo_nome = secure_filename(file.filename)
+            path, tamanho = uploads.save(file, file.filename.rsplit('.', 1)[1])
+            # Arquivo pequeno vai anexado (lido só na hora do envio); grande vai como link assinado
+            if tamanho <= app.config['MAIL_ATTACH_MAX_SIZE']: anexos = [(arquivo_nome, "application/octet-stream", uploads.abspath(path))]
+            else: link_arquivo = url_for('upload_link', token=sign_upload(path, arquivo_nome), _external=True)
 
         db.session.add(Lead(nome=nome, email=email, telefone=telefone, projeto=projeto, data=datetime.now()))
-        db.session.commit()
-        
-        # Envio de email (Thread)
-        def send_mail_async(app, msg):
-            with app.app_context(): mail.send(msg)
-            
-        msg = Message(f"Novo Lead: {nome}", sender=app.config.get('MAIL_USERNAME'), recipients=[app.config.get('MAIL_USERNAME')])
-        msg.html = render_template('email_lead.html', nome=nome, email=email, telefone=telefone, projeto=projeto, tem_arquivo=(arquivo_nome is not None))
-        if arquivo_nome:
-            with app.open_resource(os.path.join(app.config['UPLOAD_FOLDER'], arquivo_nome)) as fp:
-                msg.attach(arquivo_nome, "application/octet-stream", fp.read())
         
-        Thread(target=send_mail_async, args=(app._get_current_object(), msg)).start()
+        # E-mail vai para a outbox na mesma transação do lead; o pool de envio cuida do resto
+        html = render_template('email_lead.html', nome=nome, email=email, telefone=telefone, projeto=projeto, tem_arquivo=(arquivo_nome is not None), link_arquivo=link_arquivo)
+        mail_queue.enqueue(f"Novo Lead: {nome}", [app.config.get('MAIL_USERNAME')], html, sender=app.config.get('MAIL_USERNAME'), attachments=anexos)
+        db.session.commit()
+        mail_queue.wake()
 
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/uploads/<path:path>')
+def uploaded_file(path):
+    # Só usada quando UPLOAD_FOLDER fica fora de static/ (ver UploadStore.url)
+    return send_from_directory(app.config['UPLOAD_FOLDER'], path)
+
+@app.route('/arquivo/<token>')
+def upload_link(token):
+    dados = unsign_upload(token, app.config['UPLOAD_LINK_MAX_AGE'])
+    if not dados: abort(404)
+    path, nome = dados
+    return send_from_directory(app.config['UPLOAD_FOLDER'], path, as_attachment=True, download_name=nome)
+
 @app.route('/admin/create_client', methods=['POST'])
 @login_required
 @admin_required
@@ -289,9 +492,9 @@ def create_client():
 @login_required
 @admin_required
 def update_client_stats(user_id):
+    stats = {l: float(v) for l, v in zip(request.form.getlist('labels[]'), request.form.getlist('values[]')) if l and v} # rótulo repetido: vale o último
     ClientStat.query.filter_by(user_id=user_id).delete()
-    for l, v in zip(request.form.getlist('labels[]'), request.form.getlist('values[]')):
-        if l and v: db.session.add(ClientStat(user_id=user_id, label=l, value=float(v), type='growth'))
+    if stats: db.session.execute(insert(ClientStat), [{'user_id': user_id, 'label': l, 'value': v, 'type': 'growth'} for l, v in stats.items()])
     p = ClientPlan.query.filter_by(user_id=user_id).first()
     if p: p.plan_name = request.form.get('plan_name'); p.benefits = json.dumps([b.strip() for b in request.form.get('benefits').split(',')])
     db.session.commit(); flash('Cliente atualizado!'); return redirect(url_for('admin', tab='clients'))
@@ -302,11 +505,38 @@ def update_client_stats(user_id):
 def delete_client(id): 
     User.query.filter_by(id=id).delete(); db.session.commit(); return redirect(url_for('admin', tab='clients'))
 
+# --- IMPORTAÇÃO CSV ---
+@app.route('/admin/import', methods=['POST'])
+@login_required
+@admin_required
+def admin_import():
+    kind, f = request.form.get('kind'), request.files.get('file')
+    if kind not in IMPORTS: return jsonify({'error': 'Tipo de importação inválido'}), 400
+    if not f or not f.filename.lower().endswith('.csv'): return jsonify({'error': 'Envie um arquivo .csv'}), 400
+    job = imports.submit(kind, f)
+    return jsonify(job.to_dict()), 200 if job.finished_at else 202
+
+@app.route('/admin/import/<job_id>')
+@login_required
+@admin_required
+def admin_import_status(job_id):
+    job = db.get_or_404(ImportJob, job_id)
+    return jsonify(job.to_dict())
+
+@app.route('/admin/import/<job_id>/errors.csv')
+@login_required
+@admin_required
+def admin_import_errors(job_id):
+    job = db.get_or_404(ImportJob, job_id)
+    erros = json.loads(job.errors or '[]')
+    return current_app.response_class(csv_stream(['Linha', 'Erro'], ((e['linha'], e['erro']) for e in erros)), mimetype=FORMATS['csv'][1],
+                                      headers={'Content-Disposition': f'attachment; filename=importacao_{job.kind}_erros.csv'})
+
 # --- AVALIAÇÕES ---
 @app.route('/submit_review', methods=['POST'])
 @csrf.exempt
 def submit_review():
-    try: d = request.json; db.session.add(Review(nome=d.get('nome'), empresa=d.get('empresa'), email=d.get('email'), avaliacao=d.get('avaliacao'), estrelas=int(d.get('estrelas',5)), visivel=True, data=datetime.now())); db.session.commit(); return jsonify({'status': 'success'})
+    try: d = request.json; db.session.add(Review(nome=d.get('nome'), empresa=d.get('empresa'), email=d.get('email'), avaliacao=d.get('avaliacao'), estrelas=min(max(int(d.get('estrelas',5)), 1), 5), visivel=True, data=datetime.now())); db.session.commit(); return jsonify({'status': 'success'})
     except: return jsonify({'status': 'error'}), 500
 
 @app.route('/admin/toggle_review/<int:id>')
@@ -317,20 +547,118 @@ def toggle_review(id): r=db.session.get(Review,id); r.visivel=not r.visivel; db.
 @app.route('/admin/delete_review/<int:id>')
 @login_required
 @admin_required
-def delete_review(id): Review.query.filter_by(id=id).delete(); db.session.commit(); return redirect(url_for('admin', tab='reviews'))
+def delete_review(id):
+    r = db.session.get(Review, id)
+    if r: db.session.delete(r); db.session.commit() # delete pela ORM para o rollup descontar
+    return redirect(url_for('admin', tab='reviews'))
 
 # --- CHAT ---
+def serialize_message(m):
+    d = {'id': m.id, 'remetente': m.remetente, 'conteudo': m.conteudo, 'tipo': m.tipo}
+    if m.tipo in ('audio', 'arquivo'): d['url'] = uploads.url(m.conteudo)
+    return d
+
+def chat_head(*criteria):
+    """(id, status, último id de mensagem, arquivada?) da sessão, numa única consulta."""
+    ultimo = db.session.query(func.max(ChatMessage.id)).filter(ChatMessage.session_id == ChatSession.id).correlate(ChatSession).scalar_subquery()
+    return db.session.query(ChatSession.id, ChatSession.status, func.coalesce(ultimo, ChatArchive.last_id), ChatSession.archived_at != None) \
+        .outerjoin(ChatArchive, ChatArchive.session_id == ChatSession.id).filter(*criteria).first()
+
+def chat_etag(head):
+    return f"{head[0]}-{head[2] or 0}-{head[1]}" if head else "0-0-Closed"
+
+def chat_payload(head, after_id):
+    if not head: return {'messages': [], 'status': 'Closed', 'last_id': after_id}
+    sess_id, status, last_id, arquivada = head
+    last_id = last_id or 0
+    msgs = []
+    if last_id > after_id:
+        if arquivada: msgs = chat_archive.read(sess_id, after_id) # encerrada há tempo: histórico vem do arquivo
+        msgs += ChatMessage.query.filter(ChatMessage.session_id == sess_id, ChatMessage.id > after_id).order_by(ChatMessage.id).all()
+    return {'messages': [serialize_message(m) for m in msgs], 'status': status, 'last_id': max(last_id, after_id)}
+
+def notify_chat(sess):
+    try: chat_events.publish(sess.session_uuid, *([f"user-{sess.user_id}"] if sess.user_id else []))
+    except sqlite3.Error as e: app.logger.warning(f"Falha ao publicar evento do chat: {e}")
+
+def chat_sync(channel, *criteria):
+    """Sincronização incremental do chat.
+
+    Devolve só as mensagens com id > ``after_id`` e o status da sessão. O ETag é
+    derivado de (sessão, último id, status), então um poll ocioso custa uma única
+    consulta e responde 304 sem corpo. Com ``wait=N`` vira long-poll: se o ETag
+    enviado ainda vale, espera até N segundos por um evento no canal. Sem vaga de
+    espera no worker (CHAT_STREAM_MAX) responde na hora, com Retry-After.
+    """
+    after_id = request.args.get('after_id', 0, type=int)
+    wait = min(request.args.get('wait', 0, type=float), app.config['CHAT_STREAM_TIMEOUT'])
+    vaga = wait > 0 and chat_events.acquire()
+    try:
+        version = chat_events.current(channel) if vaga else None
+        head = chat_head(*criteria)
+        etag = chat_etag(head)
+        if vaga and request.if_none_match.contains_weak(etag):
+            db.session.close() # libera a conexão enquanto espera
+            if chat_events.wait(channel, version, wait) is not None:
+                head = chat_head(*criteria)
+                etag = chat_etag(head)
+    finally:
+        if vaga: chat_events.release()
+    if request.if_none_match.contains_weak(etag):
+        resp = current_app.response_class(status=304)
+    else:
+        resp = jsonify(chat_payload(head, after_id))
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    if wait > 0 and not vaga: resp.headers['Retry-After'] = str(app.config['CHAT_POLL_INTERVAL'])
+    return resp
+
+def chat_stream(channel, *criteria):
+    """Server-Sent Events do chat: um evento com o mesmo payload de get_messages a cada mudança.
+
+    A conexão dura até CHAT_STREAM_TIMEOUT; o EventSource reconecta sozinho e
+    retoma pelo Last-Event-ID (o último id de mensagem entregue). Sem vaga no
+    worker responde 204, que faz o navegador parar de reconectar e o cliente
+    passar ao polling.
+    """
+    if not chat_events.acquire():
+        return current_app.response_class(status=204, headers={'Retry-After': str(app.config['CHAT_POLL_INTERVAL'])})
+    after_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('after_id', 0, type=int)
+    deadline = time.monotonic() + app.config['CHAT_STREAM_TIMEOUT']
+    def gerar(after_id):
+        yield 'retry: 1000\n\n'
+        etag = None
+        version = chat_events.current(channel)
+        while True:
+            head = chat_head(*criteria)
+            if chat_etag(head) != etag:
+                etag = chat_etag(head)
+                payload = chat_payload(head, after_id)
+                after_id = payload['last_id']
+                yield f"id: {after_id}\ndata: {json.dumps(payload)}\n\n"
+            db.session.close()
+            restante = deadline - time.monotonic()
+            if restante <= 0: return
+            novo = chat_events.wait(channel, version, min(restante, 15))
+            if novo is None: yield ': ping\n\n'
+            else: version = novo
+    resp = current_app.response_class(stream_with_context(gerar(after_id)), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    resp.call_on_close(chat_events.release) # o servidor fecha a resposta mesmo se o cliente cair antes do fim
+    return resp
+
 @app.route('/cliente')
 @login_required
 def client_dashboard():
     if current_user.role != 'client': return redirect(url_for('admin_login'))
     plan = ClientPlan.query.filter_by(user_id=current_user.id).first()
-    stats = ClientStat.query.filter_by(user_id=current_user.id).all()
+    # Com séries temporais o gráfico busca /client/metrics; sem elas, segue com os rótulos do ClientStat
+    metrics = [m for (m,) in db.session.query(ClientMetricMonthly.metric).filter_by(user_id=current_user.id).distinct().order_by(ClientMetricMonthly.metric)]
+    stats = [] if metrics else ClientStat.query.filter_by(user_id=current_user.id).all()
     chart_data = {'labels': [s.label for s in stats], 'values': [s.value for s in stats]}
     benefits = json.loads(plan.benefits) if plan and plan.benefits else []
     chat_session = ChatSession.query.filter_by(user_id=current_user.id, status='Aberto').first()
     messages = ChatMessage.query.filter_by(session_id=chat_session.id).order_by(ChatMessage.data).all() if chat_session else []
-    return render_template('client_dashboard.html', user=current_user, plan=plan, benefits=benefits, chart_data=json.dumps(chart_data), chat_session=chat_session, messages=messages)
+    return render_template('client_dashboard.html', user=current_user, plan=plan, benefits=benefits, chart_data=chart_data, metrics=metrics, chat_session=chat_session, messages=messages)
 
 @app.route('/client/send_message', methods=['POST'])
 @login_required
@@ -340,20 +668,50 @@ def client_send_message():
         sess = ChatSession(session_uuid=uuid.uuid4().hex, user_id=current_user.id, client_name=current_user.name, category='Cliente Dashboard', status='Aberto')
         db.session.add(sess); db.session.commit(); db.session.add(ChatMessage(session_id=sess.id, tipo='texto', remetente='system', conteudo='Olá! Em que posso ajudar?'))
     db.session.add(ChatMessage(session_id=sess.id, tipo='texto', remetente='user', conteudo=request.form.get('message'), data=datetime.now())); db.session.commit()
+    notify_chat(sess)
     return jsonify({'status': 'success'})
 
 @app.route('/client/get_chat', methods=['GET'])
 @login_required
 def client_get_chat():
-    sess = ChatSession.query.filter_by(user_id=current_user.id, status='Aberto').first()
-    msgs = ChatMessage.query.filter_by(session_id=sess.id).order_by(ChatMessage.data).all() if sess else []
-    return jsonify({'messages': [{'remetente': m.remetente, 'conteudo': m.conteudo} for m in msgs]})
+    return chat_sync(f"user-{current_user.id}", ChatSession.user_id == current_user.id, ChatSession.status == 'Aberto')
+
+@app.route('/client/chat_stream')
+@login_required
+@no_compress
+def client_chat_stream():
+    return chat_stream(f"user-{current_user.id}", ChatSession.user_id == current_user.id, ChatSession.status == 'Aberto')
+
+# --- SÉRIES TEMPORAIS ---
+def metrics_args():
+    """(user_id, métrica, inicio, fim) da query string; admin escolhe o cliente com ?user_id=."""
+    user_id = request.args.get('user_id', type=int) if current_user.role == 'admin' else current_user.id
+    metric = request.args.get('metric', '')
+    if not user_id or not metric: abort(400)
+    try: inicio, fim = parse_range(request.args.get('inicio'), request.args.get('fim'))
+    except ValueError: abort(400)
+    return user_id, metric, inicio, fim
+
+@app.route('/client/metrics')
+@login_required
+def client_metrics():
+    user_id, metric, inicio, fim = metrics_args()
+    points = min(request.args.get('points', 300, type=int), app.config['TIMESERIES_MAX_POINTS'])
+    resolucao, pontos = series(user_id, metric, inicio, fim, max(points, 3), app.config['TIMESERIES_RAW_LIMIT'])
+    return jsonify({'metric': metric, 'resolution': resolucao, 'points': [[ts.isoformat(), v] for ts, v in pontos]})
+
+@app.route('/client/metrics/monthly')
+@login_required
+def client_metrics_monthly():
+    user_id, metric, inicio, fim = metrics_args()
+    return jsonify({'metric': metric, 'months': monthly(user_id, metric, inicio, fim)})
 
 @app.route('/init_session', methods=['POST'])
 @csrf.exempt
 def init_session():
     d=request.json; ns=ChatSession(session_uuid=uuid.uuid4().hex, category=d.get('category'), client_name=d.get('name'), client_phone=d.get('phone'), status='Aberto')
     db.session.add(ns); db.session.commit(); db.session.add(ChatMessage(session_id=ns.id, tipo='texto', conteudo=f"Olá {d.get('name')}.", remetente='system', data=datetime.now())); db.session.commit()
+    notify_chat(ns)
     return jsonify({'status':'success', 'session_id':ns.session_uuid, 'ticket':f"#{ns.id:04d}"})
 
 @app.route('/send_chat', methods=['POST'])
@@ -362,20 +720,34 @@ def send_chat():
     sess=ChatSession.query.filter_by(session_uuid=request.form.get('session_id')).first()
     if sess:
         if 'message' in request.form: db.session.add(ChatMessage(session_id=sess.id, tipo='texto', conteudo=request.form['message'], remetente=request.form.get('remetente'), data=datetime.now()))
-        if 'audio' in request.files: f=request.files['audio']; n=f"audio_{uuid.uuid4().hex}.webm"; f.save(os.path.join(app.config['UPLOAD_FOLDER'], n)); db.session.add(ChatMessage(session_id=sess.id, tipo='audio', conteudo=n, remetente=request.form.get('remetente'), data=datetime.now()))
+        if 'audio' in request.files: n, _ = uploads.save(request.files['audio'], 'webm'); db.session.add(ChatMessage(session_id=sess.id, tipo='audio', conteudo=n, remetente=request.form.get('remetente'), data=datetime.now()))
+        f = request.files.get('arquivo')
+        if f and f.filename and allowed_file(f.filename): n, _ = uploads.save(f, f.filename.rsplit('.', 1)[1]); db.session.add(ChatMessage(session_id=sess.id, tipo='arquivo', conteudo=n, remetente=request.form.get('remetente'), data=datetime.now()))
         db.session.commit()
+        notify_chat(sess)
     return jsonify({'status':'success'})
 
 @app.route('/get_messages/<session_uuid>') 
 def get_messages(session_uuid):
-    sess=ChatSession.query.filter_by(session_uuid=session_uuid).first()
-    msgs=ChatMessage.query.filter_by(session_id=sess.id).order_by(ChatMessage.data).all() if sess else []
-    return jsonify({'messages':[{'remetente':m.remetente,'conteudo':m.conteudo,'tipo':m.tipo} for m in msgs], 'status':sess.status if sess else 'Closed'})
+    return chat_sync(session_uuid, ChatSession.session_uuid == session_uuid)
+
+@app.route('/chat_stream/<session_uuid>')
+@no_compress
+def chat_stream_public(session_uuid):
+    return chat_stream(session_uuid, ChatSession.session_uuid == session_uuid)
+
+@app.route('/chat/<session_uuid>/read', methods=['POST'])
+@csrf.exempt
+def mark_chat_read(session_uuid):
+    # admin marca o lado do atendimento; visitante/cliente (quem tem o uuid), o próprio
+    lado = 'admin' if current_user.is_authenticated and current_user.role == 'admin' else 'client'
+    chat_inbox.mark_read(session_uuid, lado)
+    return jsonify({'status': 'success'})
 
 @app.route('/close_ticket/<session_uuid>', methods=['POST'])
 @csrf.exempt
 @login_required
-def close_ticket(session_uuid): sess=ChatSession.query.filter_by(session_uuid=session_uuid).first(); sess.status='Encerrado'; db.session.commit(); return jsonify({'status':'success'})
+def close_ticket(session_uuid): sess=ChatSession.query.filter_by(session_uuid=session_uuid).first(); sess.status='Encerrado'; sess.closed_at=datetime.now(); db.session.commit(); notify_chat(sess); return jsonify({'status':'success'})
 
 if __name__ == '__main__':
     with app.app_context():
@@ -0,0 +1,138 @@
+"""Assets estáticos minificados, com hash no nome e pré-comprimidos.
+
+``build_assets`` gera em ``static/dist`` uma cópia minificada de cada arquivo de
+ASSET_FILES com o hash do conteúdo no nome (``style.3f2a9c1e.css``), mais as
+variantes ``.gz`` e ``.br`` (brotli só se o pacote estiver instalado), e grava o
+``manifest.json``. Nos templates, ``asset_url('style.css')`` aponta para a versão
+com hash; como o nome muda a cada alteração, a rota ``/assets`` responde com
+``Cache-Control: immutable`` e o arquivo já comprimido que o navegador aceitar.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import uuid
+
+from flask import abort, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError: # opcional: sem ele só sai o .gz
+    brotli = None
+
+ASSET_FILES = ('style.css', 'script.js', 'chat.js')
+ONE_YEAR = 365 * 24 * 3600
+
+
+def minify_css(src):
+    src = re.sub(r'/\*.*?\*/', '', src, flags=re.S)
+    src = re.sub(r'\s+', ' ', src)
+    src = re.sub(r'\s*([{};,])\s*', r'\1', src)
+    return src.replace(';}', '}').strip()
+
+
+def minify_js(src):
+    """Minificação conservadora: tira indentação, linhas em branco e comentários de linha inteira.
+
+    Não junta linhas (a inserção automática de ponto e vírgula continua valendo) e
+    não mexe no interior de template strings de várias linhas.
+    """
+    saida, em_template, em_comentario = [], False, False
+    for linha in src.splitlines():
+        if em_template:
+            saida.append(linha)
+        else:
+            s = linha.strip()
+            if em_comentario:
+                em_comentario = '*/' not in s
+                continue
+            if s.startswith('/*'):
+                em_comentario = '*/' not in s
+                continue
+            if s and not s.startswith('//'):
+                saida.append(s)
+        if linha.replace('\\`', '').count('`') % 2: em_template = not em_template
+    return '\n'.join(saida) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _write(path, data):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, 'wb') as fp: fp.write(data)
+    os.replace(tmp, path)
+
+
+def build_assets(static_folder, files=ASSET_FILES):
+    """Gera os arquivos de ``static/dist`` e devolve o manifesto {original: nome com hash}."""
+    destino = os.path.join(static_folder, 'dist')
+    os.makedirs(destino, exist_ok=True)
+    manifest = {}
+    for nome in files:
+        base, ext = os.path.splitext(nome)
+        with open(os.path.join(static_folder, nome), encoding='utf-8') as fp:
+            dados = MINIFIERS.get(ext, lambda s: s)(fp.read()).encode('utf-8')
+        final = f"{base}.{hashlib.sha256(dados).hexdigest()[:10]}{ext}"
+        _write(os.path.join(destino, final), dados)
+        _write(os.path.join(destino, final + '.gz'), gzip.compress(dados, 9, mtime=0))
+        if brotli: _write(os.path.join(destino, final + '.br'), brotli.compress(dados))
+        manifest[nome] = final
+    _write(os.path.join(destino, 'manifest.json'), json.dumps(manifest, indent=2).encode())
+    # remove versões antigas (o manifesto novo já está no lugar)
+    validos = {'manifest.json'} | {f + s for f in manifest.values() for s in ('', '.gz', '.br')}
+    for e in os.scandir(destino):
+        if e.name not in validos and not e.name.endswith('.tmp'): os.remove(e.path)
+    return manifest
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.dir = os.path.join(app.static_folder, 'dist')
+        self.manifest = self.load()
+        app.add_url_rule('/assets/<path:filename>', 'asset', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+        app.extensions['assets'] = self
+
+    def load(self):
+        """Lê o manifesto; gera os arquivos se ele faltar ou algum original for mais novo."""
+        path = os.path.join(self.dir, 'manifest.json')
+        try:
+            gerado = os.stat(path).st_mtime
+            if all(os.stat(os.path.join(self.static_folder, n)).st_mtime <= gerado for n in ASSET_FILES):
+                with open(path) as fp: return json.load(fp)
+        except (OSError, ValueError):
+            pass
+        return build_assets(self.static_folder)
+
+    def build(self):
+        self.manifest = build_assets(self.static_folder)
+        return self.manifest
+
+    def url(self, filename):
+        final = self.manifest.get(filename)
+        return url_for('asset', filename=final) if final else url_for('static', filename=filename)
+
+    def serve(self, filename):
+        if filename not in self.manifest.values(): abort(404)
+        mimetype = mimetypes.guess_type(filename)[0]
+        aceita = request.accept_encodings
+        for enc, suf in (('br', '.br'), ('gzip', '.gz')):
+            if aceita[enc] and os.path.exists(os.path.join(self.dir, filename + suf)):
+                resp = send_from_directory(self.dir, filename + suf, mimetype=mimetype, max_age=ONE_YEAR)
+                resp.headers['Content-Encoding'] = enc
+                break
+        else:
+            resp = send_from_directory(self.dir, filename, mimetype=mimetype, max_age=ONE_YEAR)
+        resp.vary.add('Accept-Encoding')
+        resp.cache_control.public = True
+        resp.cache_control.immutable = True
+        return resp
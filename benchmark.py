@@ -0,0 +1,336 @@
+"""Benchmark HTTP do site sob gunicorn, com banco SQLite e SMTP falsos.
+
+Sobe o app como no Procfile (gthread) num diretório temporário, semeado com o
+mesmo seed do query_budget, e um servidor SMTP local que só aceita as mensagens.
+Depois dispara tráfego misto por ``--duration`` segundos:
+
+* ``--users`` usuários em loop fechado (sem pausa) escolhendo entre ver a home,
+  mandar lead (com e sem anexo), abrir chat e mandar mensagens, ou abrir o painel;
+* ``--widgets`` widgets de chat abertos, cada um consultando ``get_messages`` a
+  cada ``--poll-interval`` segundos, como o fallback de long-poll do navegador.
+
+Imprime vazão e latência p50/p95/p99 por rota e grava o resultado em
+``bench_results/<data>-<commit>.json``. Com ``--save-baseline`` o resultado vira
+a referência (``bench_results/baseline.json``); as rodadas seguintes mostram a
+variação contra ela. Os números dependem da máquina, então a referência fica
+local, fora do git, como os demais resultados.
+
+    python -m benchmark --workers 2 --users 20 --widgets 50 --duration 30
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT, 'bench_results')
+BASELINE = os.path.join(RESULTS_DIR, 'baseline.json')
+
+# cenário -> peso no sorteio dos usuários
+MIX = {'home': 50, 'lead': 8, 'lead_anexo': 2, 'chat': 15, 'admin': 5}
+
+
+# --- SMTP falso ---
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        w = lambda linha: self.wfile.write(linha.encode() + b'\r\n')
+        w('220 bench')
+        em_dados = False
+        while (linha := self.rfile.readline()):
+            cmd = linha.rstrip(b'\r\n')
+            if em_dados:
+                if cmd == b'.':
+                    em_dados = False
+                    self.server.received += 1
+                    w('250 ok')
+                continue
+            verbo = cmd[:4].upper()
+            if verbo == b'DATA':
+                em_dados = True
+                w('354 go')
+            elif verbo == b'QUIT':
+                w('221 bye')
+                return
+            else:
+                w('250 ok')
+
+
+def start_smtp():
+    srv = socketserver.ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+    srv.daemon_threads = True
+    srv.received = 0
+    threading.Thread(target=srv.serve_forever, name='fake-smtp', daemon=True).start()
+    return srv
+
+
+# --- servidor ---
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def prepare(pasta, smtp_port):
+    env = dict(os.environ,
+               DATABASE_URL=f"sqlite:///{os.path.join(pasta, 'bench.db')}",
+               CHAT_EVENTS_DB=os.path.join(pasta, 'chat_events.db'),
+               METRICS_DIR=os.path.join(pasta, 'metrics'),
+               PAGE_CACHE_VERSION_FILE=os.path.join(pasta, 'site_version'),
+               USER_CACHE_VERSION_FILE=os.path.join(pasta, 'users_version'),
+               IMPORT_FOLDER=os.path.join(pasta, 'imports'),
+               UPLOAD_FOLDER=os.path.join(pasta, 'uploads'),
+               MAIL_SERVER='127.0.0.1', MAIL_PORT=str(smtp_port), MAIL_USE_SSL='0',
+               MAIL_USERNAME='bench@example.com', RATELIMIT_ENABLED='0', SECRET_KEY=uuid.uuid4().hex)
+    script = 'from app import app, db\nfrom query_budget import seed\nwith app.app_context():\n    db.create_all()\n    seed()\n'
+    subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env, check=True)
+    return env
+
+
+def start_server(env, port, workers, threads):
+    cmd = [sys.executable, '-m', 'gunicorn', 'wsgi:app', '--worker-class', 'gthread', '--threads', str(threads),
+           '--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        try:
+            c = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            c.request('GET', '/termos-e-privacidade')
+            c.getresponse().read()
+            return proc
+        except OSError:
+            if proc.poll() is not None: break
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError('gunicorn não subiu')
+
+
+# --- cliente ---
+class Client:
+    """Conexão keep-alive com cookies, como um navegador."""
+
+    def __init__(self, port, rec):
+        self.port, self.rec = port, rec
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, nome, metodo, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if self.cookies: headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+        for tentativa in (1, 2):
+            reaproveitada = self.conn is not None
+            inicio = time.perf_counter()
+            try:
+                if self.conn is None: self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+                self.conn.request(metodo, path, body=body, headers=headers)
+                resp = self.conn.getresponse()
+                dados = resp.read()
+                break
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                # keep-alive fechado pelo servidor enquanto ocioso: o navegador reenvia, aqui também
+                if reaproveitada and tentativa == 1: continue
+                self.rec.record(nome, time.perf_counter() - inicio, False)
+                return None, {}, b''
+        for v in resp.headers.get_all('Set-Cookie') or []:
+            k, _, resto = v.partition('=')
+            self.cookies[k] = resto.split(';', 1)[0]
+        self.rec.record(nome, time.perf_counter() - inicio, resp.status < 400)
+        return resp.status, resp.headers, dados
+
+    def post_json(self, nome, path, obj):
+        return self.request(nome, 'POST', path, json.dumps(obj), {'Content-Type': 'application/json'})
+
+    def post_form(self, nome, path, campos, arquivos=()):
+        if not arquivos:
+            from urllib.parse import urlencode
+            return self.request(nome, 'POST', path, urlencode(campos), {'Content-Type': 'application/x-www-form-urlencoded'})
+        limite = uuid.uuid4().hex
+        partes = [f'--{limite}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode() for k, v in campos.items()]
+        for campo, nome_arq, conteudo in arquivos:
+            partes.append(f'--{limite}\r\nContent-Disposition: form-data; name="{campo}"; filename="{nome_arq}"\r\n'
+                          f'Content-Type: application/octet-stream\r\n\r\n'.encode() + conteudo + b'\r\n')
+        corpo = b''.join(partes) + f'--{limite}--\r\n'.encode()
+        return self.request(nome, 'POST', path, corpo, {'Content-Type': f'multipart/form-data; boundary={limite}'})
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+
+    def record(self, nome, segundos, ok):
+        with self._lock:
+            self.samples[nome].append(segundos)
+            if not ok: self.errors[nome] += 1
+
+
+# --- cenários ---
+def home(c, rnd):
+    c.request('GET /', 'GET', '/')
+
+
+def lead(c, rnd, anexo=False):
+    campos = {'nome': 'Bench', 'email': 'bench@example.com', 'telefone': '11999999999', 'projeto': 'Teste de carga'}
+    if not anexo: return c.post_form('POST /submit_lead', '/submit_lead', campos)
+    tamanho = rnd.choice((200 * 1024, 3 * 1024 * 1024)) # anexado / link assinado
+    c.post_form('POST /submit_lead (anexo)', '/submit_lead', campos, [('arquivo', 'proposta.pdf', os.urandom(tamanho))])
+
+
+def chat(c, rnd):
+    _, _, dados = c.post_json('POST /init_session', '/init_session', {'name': 'Bench', 'category': 'Geral', 'phone': '1'})
+    try: sessao = json.loads(dados)['session_id']
+    except ValueError: return
+    for i in range(rnd.randint(1, 4)):
+        c.post_form('POST /send_chat', '/send_chat', {'session_id': sessao, 'message': f'mensagem {i}', 'remetente': 'user'})
+
+
+def admin_login(c):
+    _, _, html = c.request('GET /admin/login', 'GET', '/admin/login')
+    m = re.search(rb'name="csrf_token" type="hidden" value="([^"]+)"', html) or re.search(rb'value="([^"]+)"[^>]*name="csrf_token"', html)
+    c.post_form('POST /admin/login', '/admin/login', {'csrf_token': m.group(1).decode() if m else '', 'username': 'admin', 'password': 'senha'})
+
+
+def admin(c, rnd):
+    if not getattr(c, 'is_admin', False):
+        admin_login(c)
+        c.is_admin = True
+    c.request('GET /admin', 'GET', '/admin')
+    c.request('GET /admin/tab/leads', 'GET', '/admin/tab/leads')
+
+
+SCENARIOS = {'home': home, 'lead': lead, 'lead_anexo': lambda c, rnd: lead(c, rnd, anexo=True), 'chat': chat, 'admin': admin}
+
+
+def run_user(port, rec, fim, seed):
+    rnd = random.Random(seed)
+    c = Client(port, rec)
+    nomes, pesos = zip(*MIX.items())
+    while time.monotonic() < fim:
+        SCENARIOS[rnd.choices(nomes, pesos)[0]](c, rnd)
+
+
+def run_widget(port, rec, fim, intervalo, seed):
+    rnd = random.Random(seed)
+    c = Client(port, rec)
+    time.sleep(rnd.uniform(0, intervalo)) # widgets não abrem todos no mesmo instante
+    _, _, dados = c.post_json('POST /init_session', '/init_session', {'name': 'Widget', 'category': 'Geral'})
+    try: sessao = json.loads(dados)['session_id']
+    except ValueError: return
+    ultimo, etag = 0, None
+    while time.monotonic() < fim:
+        status, headers, dados = c.request('GET /get_messages', 'GET', f'/get_messages/{sessao}?after_id={ultimo}',
+                                           headers={'If-None-Match': etag} if etag else None)
+        if status == 200:
+            etag = headers.get('ETag')
+            ultimo = json.loads(dados).get('last_id', ultimo)
+        time.sleep(intervalo)
+
+
+# --- relatório ---
+def percentile(ordenado, p):
+    if not ordenado: return 0.0
+    return ordenado[min(len(ordenado) - 1, max(0, round(p / 100 * len(ordenado)) - 1))]
+
+
+def summarize(rec, duracao):
+    resumo = {}
+    for nome, amostras in sorted(rec.samples.items()):
+        s = sorted(amostras)
+        resumo[nome] = {'count': len(s), 'errors': rec.errors[nome], 'rps': round(len(s) / duracao, 2),
+                        **{f'p{p}': round(percentile(s, p) * 1000, 2) for p in (50, 95, 99)}}
+    return resumo
+
+
+def print_report(resultado, base=None):
+    print(f"\n{'rota':28} {'reqs':>7} {'erros':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}" + ('  Δp95     Δreq/s' if base else ''))
+    for nome, r in resultado['endpoints'].items():
+        linha = f"{nome:28} {r['count']:7} {r['errors']:6} {r['rps']:8.1f} {r['p50']:8.1f} {r['p95']:8.1f} {r['p99']:8.1f}"
+        b = (base or {}).get('endpoints', {}).get(nome)
+        if b:
+            dp95 = (r['p95'] / b['p95'] - 1) * 100 if b['p95'] else 0
+            drps = (r['rps'] / b['rps'] - 1) * 100 if b['rps'] else 0
+            linha += f"  {dp95:+6.1f}%  {drps:+6.1f}%"
+        print(linha)
+    t = resultado['totals']
+    print(f"\nTotal: {t['requests']} requests, {t['rps']:.1f} req/s, {t['errors']} erro(s), {t['emails']} e-mail(s) entregues ao SMTP falso")
+
+
+def git_commit():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip() or 'sem-git'
+    except OSError: return 'sem-git'
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    ap.add_argument('--workers', type=int, default=2)
+    ap.add_argument('--threads', type=int, default=16)
+    ap.add_argument('--users', type=int, default=20)
+    ap.add_argument('--widgets', type=int, default=20)
+    ap.add_argument('--poll-interval', type=float, default=3)
+    ap.add_argument('--duration', type=float, default=30)
+    ap.add_argument('--baseline', default=BASELINE, help='resultado de referência para comparar')
+    ap.add_argument('--save-baseline', action='store_true')
+    args = ap.parse_args(argv)
+
+    pasta = tempfile.mkdtemp(prefix='bench-')
+    smtp = start_smtp()
+    proc = None
+    try:
+        env = prepare(pasta, smtp.server_address[1])
+        port = free_port()
+        proc = start_server(env, port, args.workers, args.threads)
+        rec = Recorder()
+        inicio = time.monotonic()
+        fim = inicio + args.duration
+        threads = [threading.Thread(target=run_user, args=(port, rec, fim, i), daemon=True) for i in range(args.users)]
+        threads += [threading.Thread(target=run_widget, args=(port, rec, fim, args.poll_interval, 1000 + i), daemon=True) for i in range(args.widgets)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        duracao = time.monotonic() - inicio
+        time.sleep(1) # dá tempo ao pool de e-mail de esvaziar a outbox
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(10)
+        smtp.shutdown()
+        shutil.rmtree(pasta, ignore_errors=True)
+
+    endpoints = summarize(rec, duracao)
+    total = sum(r['count'] for r in endpoints.values())
+    resultado = {
+        'commit': git_commit(), 'date': datetime.now().isoformat(timespec='seconds'),
+        'config': {k: v for k, v in vars(args).items() if k not in ('baseline', 'save_baseline')},
+        'endpoints': endpoints,
+        'totals': {'requests': total, 'rps': round(total / duracao, 2), 'errors': sum(rec.errors.values()), 'emails': smtp.received},
+    }
+    base = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as fp: base = json.load(fp)
+        print(f"Comparando com {os.path.relpath(args.baseline, ROOT)} (commit {base.get('commit')}, {base.get('date')})")
+    print_report(resultado, base)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    destino = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{resultado['commit']}.json")
+    with open(destino, 'w') as fp: json.dump(resultado, fp, indent=2)
+    if args.save_baseline: shutil.copyfile(destino, BASELINE)
+    print(f"Resultado salvo em {os.path.relpath(destino, ROOT)}" + (' (nova referência)' if args.save_baseline else ''))
+    return 1 if resultado['totals']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
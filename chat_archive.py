@@ -0,0 +1,93 @@
+"""Arquivamento das conversas encerradas.
+
+Sessões encerradas há mais de CHAT_ARCHIVE_AFTER_DAYS dias têm as mensagens
+movidas para ``ChatArchive``: uma linha por sessão com o histórico em JSONL
+comprimido, gravada na mesma transação que apaga as linhas de ``chat_message``.
+Assim a tabela quente e o índice (session_id, id) ficam só com as conversas
+recentes. Na mesma transação, as entradas de busca das mensagens dão lugar a
+um documento só com o texto da sessão (``search.ARCHIVE_CODE``), e os anexos
+(áudio e arquivo) perdem a referência no ``UploadStore``; os que chegam a zero
+só saem do disco depois do commit do lote, então um lote desfeito não deixa
+mensagem arquivada apontando para arquivo apagado.
+
+A ChatSession continua no lugar, marcada com ``archived_at``: é pequena e é o
+que as listas do painel paginam. ``read`` devolve o histórico arquivado com os
+mesmos atributos de ChatMessage, então get_messages e o painel leem de um ou
+de outro sem diferença.
+"""
+import json
+import zlib
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+
+from models import db, ChatSession, ChatMessage, ChatArchive
+import search
+
+ArchivedMessage = namedtuple('ArchivedMessage', 'id remetente conteudo tipo data')
+
+
+def _pack(msgs):
+    linhas = (json.dumps([m.id, m.remetente, m.conteudo, m.tipo, m.data.isoformat() if m.data else None], ensure_ascii=False) for m in msgs)
+    return zlib.compress('\n'.join(linhas).encode(), 9)
+
+
+def unpack(blob, after_id=0):
+    """Mensagens de um ``ChatArchive.data`` com id > ``after_id``, em ordem."""
+    msgs = []
+    for linha in zlib.decompress(blob).decode().splitlines():
+        i, remetente, conteudo, tipo, data = json.loads(linha)
+        if i > after_id: msgs.append(ArchivedMessage(i, remetente, conteudo, tipo, data and datetime.fromisoformat(data)))
+    return msgs
+
+
+def read(session_id, after_id=0):
+    """Mensagens arquivadas da sessão com id > ``after_id``, em ordem ([] se não há arquivo)."""
+    blob = db.session.scalar(select(ChatArchive.data).where(ChatArchive.session_id == session_id))
+    return [] if blob is None else unpack(blob, after_id)
+
+
+def _document(session_id, msgs):
+    return session_id * 4 + search.ARCHIVE_CODE, ' '.join(m.conteudo or '' for m in msgs if m.tipo == 'texto')
+
+
+def index_all(conn, batch_size=500):
+    """Indexa o texto de todas as sessões arquivadas (parte de ``search.rebuild``)."""
+    ids = conn.execute(select(ChatArchive.session_id).order_by(ChatArchive.session_id)).scalars().all()
+    for i in range(0, len(ids), batch_size):
+        linhas = conn.execute(select(ChatArchive.session_id, ChatArchive.data).where(ChatArchive.session_id.in_(ids[i:i + batch_size])))
+        search.index_documents(conn, [d for d in (_document(s, unpack(blob)) for s, blob in linhas) if d[1]])
+
+
+def archive(days, batch_size=200, now=None):
+    """Arquiva as sessões encerradas antes de ``now - days``, um lote por transação.
+
+    Devolve (sessões, mensagens) arquivadas.
+    """
+    limite = (now or datetime.now()) - timedelta(days=days)
+    sessoes = mensagens = 0
+    while True:
+        ids = db.session.scalars(select(ChatSession.id).where(ChatSession.status == 'Encerrado', ChatSession.archived_at == None, ChatSession.closed_at < limite)
+                                 .order_by(ChatSession.closed_at).limit(batch_size)).all()
+        if not ids: return sessoes, mensagens
+        por_sessao = {}
+        for m in db.session.execute(select(ChatMessage.session_id, ChatMessage.id, ChatMessage.remetente, ChatMessage.conteudo, ChatMessage.tipo, ChatMessage.data)
+                                    .where(ChatMessage.session_id.in_(ids)).order_by(ChatMessage.session_id, ChatMessage.id)):
+            por_sessao.setdefault(m.session_id, []).append(m)
+        conn = db.session.connection()
+        if por_sessao:
+            conn.execute(insert(ChatArchive), [{'session_id': s, 'message_count': len(msgs), 'last_id': msgs[-1].id, 'data': _pack(msgs)}
+                                               for s, msgs in por_sessao.items()])
+            conn.execute(delete(ChatMessage).where(ChatMessage.session_id.in_(ids)))
+            search.remove_documents(conn, [m.id * 4 + search.SOURCES['chat'][1] for msgs in por_sessao.values() for m in msgs if m.tipo == 'texto'])
+            search.index_documents(conn, [d for d in (_document(s, msgs) for s, msgs in por_sessao.items()) if d[1]])
+            uploads = current_app.extensions['upload_store']
+            for msgs in por_sessao.values():
+                for m in msgs:
+                    if m.tipo in ('audio', 'arquivo'): uploads.release(m.conteudo, commit=False) # uma referência por mensagem, como no save
+        conn.execute(update(ChatSession).where(ChatSession.id.in_(ids)).values(archived_at=datetime.now()))
+        db.session.commit()
+        sessoes += len(ids)
+        mensagens += sum(len(msgs) for msgs in por_sessao.values())
@@ -0,0 +1,130 @@
+"""Pub/sub dos eventos do chat entre workers do gunicorn.
+
+Cada publicação grava uma linha numa tabela SQLite local (arquivo próprio, fora
+do banco principal). Em cada worker, uma thread lê as linhas novas enquanto
+houver alguém esperando e acorda os assinantes do canal; publicações no mesmo
+processo acordam na hora.
+
+Cada conexão que espera (SSE ou long-poll) prende uma thread do worker
+gthread pela duração do timeout; ``acquire``/``release`` limitam quantas
+esperas simultâneas um worker aceita (CHAT_STREAM_MAX), para que os widgets de
+chat abertos nunca ocupem todas as threads. Quem não consegue vaga é atendido
+por polling curto.
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+
+class ChatEvents:
+    def __init__(self, app=None):
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._latest = {}        # canal -> id do último evento visto
+        self._cursor = 0         # maior id de evento já lido
+        self._floor = 0          # ids <= floor podem ter sido descartados de _latest
+        self._sinces = Counter() # marcos dos assinantes esperando agora
+        self._poller = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('CHAT_EVENTS_DB') or os.path.join(app.instance_path, 'chat_events.db')
+        self.interval = app.config.get('CHAT_EVENTS_POLL', 0.1)
+        self.retention = app.config.get('CHAT_EVENTS_RETENTION', 3600)
+        self._slots = threading.BoundedSemaphore(app.config.get('CHAT_STREAM_MAX', 8))
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=5)
+        try:
+            con.execute('PRAGMA journal_mode=WAL')
+            con.execute('CREATE TABLE IF NOT EXISTS chat_event (id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, created REAL NOT NULL)')
+            con.commit()
+            self._cursor = self._floor = con.execute('SELECT COALESCE(MAX(id), 0) FROM chat_event').fetchone()[0]
+        finally:
+            con.close()
+        app.extensions['chat_events'] = self
+
+    def _conn(self):
+        con = getattr(self._local, 'con', None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.path, timeout=5)
+        return con
+
+    def publish(self, *channels):
+        """Registra um evento em cada canal e acorda quem estiver esperando."""
+        now = time.time()
+        con = self._conn()
+        with con:
+            ids = [con.execute('INSERT INTO chat_event (channel, created) VALUES (?, ?)', (c, now)).lastrowid for c in channels]
+            if any(i % 1000 == 0 for i in ids):
+                con.execute('DELETE FROM chat_event WHERE created < ?', (now - self.retention,))
+        self._apply(zip(channels, ids))
+
+    def acquire(self):
+        """Reserva uma vaga de espera neste worker sem bloquear; False se estiverem todas ocupadas."""
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        self._slots.release()
+
+    def current(self, channel):
+        """Marco atual para passar a ``wait``; leia-o antes de consultar o estado do chat."""
+        self._refresh()
+        return self._cursor
+
+    def wait(self, channel, since, timeout):
+        """Bloqueia até haver evento no canal depois de ``since``.
+
+        Devolve o novo marco, ou None se o tempo acabar. Acordar sem evento real
+        é possível (quem chama só reconsulta o banco).
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._sinces[since] += 1
+            self._ensure_poller()
+            try:
+                while self._latest.get(channel, 0) <= since and since >= self._floor:
+                    restante = deadline - time.monotonic()
+                    if restante <= 0:
+                        return None
+                    self._cond.wait(restante)
+                return self._cursor
+            finally:
+                self._sinces[since] -= 1
+                if not self._sinces[since]:
+                    del self._sinces[since]
+
+    def _refresh(self):
+        rows = self._conn().execute('SELECT channel, MAX(id) FROM chat_event WHERE id > ? GROUP BY channel', (self._cursor,)).fetchall()
+        if rows:
+            self._apply(rows)
+
+    def _apply(self, events):
+        with self._cond:
+            for channel, event_id in events:
+                if event_id > self._latest.get(channel, 0):
+                    self._latest[channel] = event_id
+                self._cursor = max(self._cursor, event_id)
+            if len(self._latest) > 1000:
+                self._floor = min(self._sinces) if self._sinces else self._cursor
+                self._latest = {c: i for c, i in self._latest.items() if i > self._floor}
+            self._cond.notify_all()
+
+    def _ensure_poller(self):
+        if self._poller is None:
+            self._poller = threading.Thread(target=self._poll, name='chat-events', daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        while True:
+            with self._cond:
+                if not self._sinces:
+                    self._poller = None
+                    return
+            try:
+                self._refresh()
+            except sqlite3.Error:
+                pass
+            time.sleep(self.interval)
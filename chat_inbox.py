@@ -0,0 +1,66 @@
+"""Caixa de entrada do chat no painel.
+
+Cada ChatSession guarda a data e um trecho da última mensagem e quantas
+mensagens cada lado ainda não leu: ``unread_admin`` (do visitante ou cliente
+para o atendimento) e ``unread_client`` (do atendimento para o outro lado).
+Um listener de ``after_flush`` atualiza esses campos na mesma transação em
+que as mensagens entram (init_session, send_chat, client_send_message...),
+com um UPDATE por sessão que soma no banco (``unread_admin = unread_admin +
+n``), então envios simultâneos não se sobrescrevem. Quem responde já leu: uma
+mensagem do atendimento zera ``unread_admin`` e vice-versa.
+
+As abas de chat do painel paginam por (last_message_at, id), coberto por
+índice; ``mark_read`` zera o contador de um lado.
+"""
+from datetime import datetime
+
+from sqlalchemy import case, event, func, select, update
+from sqlalchemy.orm import Session, aliased
+
+from models import db, ChatSession, ChatMessage
+
+PREVIEW_SIZE = 120
+_PREVIEW_TIPOS = {'audio': '[Áudio]', 'arquivo': '[Arquivo]'}
+# contador -> (quem escreve, quem lê)
+_LADOS = {'unread_admin': ('user', 'admin'), 'unread_client': ('admin', 'user')}
+
+
+def preview(tipo, conteudo):
+    return (_PREVIEW_TIPOS.get(tipo) or ' '.join((conteudo or '').split()))[:PREVIEW_SIZE]
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_inbox(session, flush_context):
+    por_sessao = {}
+    for obj in session.new:
+        if isinstance(obj, ChatMessage) and obj.session_id: por_sessao.setdefault(obj.session_id, []).append(obj)
+    if not por_sessao: return
+    t = ChatSession.__table__
+    conn = session.connection()
+    for sessao, msgs in por_sessao.items():
+        ultima = max(msgs, key=lambda m: m.id)
+        valores = {'last_message_at': ultima.data or datetime.utcnow(), 'last_message_preview': preview(ultima.tipo, ultima.conteudo)}
+        for coluna, (autor, leitor) in _LADOS.items():
+            n = sum(m.remetente == autor for m in msgs)
+            if n: valores[coluna] = t.c[coluna] + n
+            elif any(m.remetente == leitor for m in msgs): valores[coluna] = 0
+        conn.execute(update(t).where(t.c.id == sessao).values(valores))
+
+
+def mark_read(session_uuid, lado):
+    """Zera as não lidas de ``lado`` ('admin' ou 'client') na sessão; devolve se havia alguma."""
+    coluna = getattr(ChatSession, f'unread_{lado}')
+    feito = db.session.execute(update(ChatSession).where(ChatSession.session_uuid == session_uuid, coluna > 0).values({coluna: 0})).rowcount
+    db.session.commit()
+    return bool(feito)
+
+
+def rebuild():
+    """Recalcula última atividade e trecho das sessões não arquivadas (depois de carga em massa, que não passa pelo listener)."""
+    m = aliased(ChatMessage)
+    ultima = select(m.id).where(m.session_id == ChatSession.id).correlate(ChatSession).order_by(m.id.desc()).limit(1).scalar_subquery()
+    db.session.execute(update(ChatSession).where(ChatSession.archived_at == None).values(
+        last_message_at=func.coalesce(select(ChatMessage.data).where(ChatMessage.id == ultima).scalar_subquery(), ChatSession.closed_at, ChatSession.created_at),
+        last_message_preview=select(case(*[(ChatMessage.tipo == k, v) for k, v in _PREVIEW_TIPOS.items()], else_=func.substr(ChatMessage.conteudo, 1, PREVIEW_SIZE)))
+            .where(ChatMessage.id == ultima).scalar_subquery()))
+    db.session.commit()
@@ -0,0 +1,87 @@
+"""Middleware WSGI de compressão e ETag/304 para as respostas HTML e JSON.
+
+Só entram respostas 200 a GET com ``Content-Length`` (corpo já pronto): streams
+como o SSE do chat passam direto, sem buffer. O corpo ganha um ETag fraco
+(tamanho + CRC32, barato) quando a rota não definiu um; se bater com o
+``If-None-Match``, a resposta vira 304 sem corpo. Acima de ``min_size`` bytes
+o corpo sai comprimido (brotli se disponível e aceito, senão gzip). Tipos já
+comprimidos (imagens, PDF, assets pré-comprimidos) não são tocados.
+
+Uma rota sai do middleware com o decorator ``no_compress``.
+"""
+import gzip
+import zlib
+from functools import wraps
+
+from flask import request
+from werkzeug.http import parse_accept_header, parse_etags, unquote_etag
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = {'text/html', 'text/plain', 'text/css', 'text/csv', 'text/javascript',
+                'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'}
+SKIP_KEY = 'compression.skip'
+
+
+def no_compress(view):
+    """Deixa a resposta da rota passar sem compressão nem ETag do middleware."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        request.environ[SKIP_KEY] = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class CompressMiddleware:
+    def __init__(self, app, min_size=1024, level=6):
+        self.app = app
+        self.min_size = min_size
+        self.level = level
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') != 'GET':
+            return self.app(environ, start_response)
+        captured = []
+        def capture(status, headers, exc_info=None):
+            captured[:] = [status, headers, exc_info]
+            return lambda data: None # write() legado: o Flask não usa
+        body_iter = self.app(environ, capture)
+        status, headers, exc_info = captured
+        h = {k.lower(): v for k, v in headers}
+        tipo = h.get('content-type', '').split(';')[0].strip()
+        if (environ.get(SKIP_KEY) or not status.startswith('200') or 'content-length' not in h
+                or 'content-encoding' in h or tipo not in COMPRESSIBLE or 'no-transform' in h.get('cache-control', '')):
+            start_response(status, headers, exc_info)
+            return body_iter
+        try: body = b''.join(body_iter)
+        finally:
+            if hasattr(body_iter, 'close'): body_iter.close()
+
+        headers = [(k, v) for k, v in headers if k.lower() not in ('content-length', 'etag', 'vary')]
+        vary = [v.strip() for v in h.get('vary', '').split(',') if v.strip()]
+        if 'Accept-Encoding' not in vary: vary.append('Accept-Encoding')
+        headers.append(('Vary', ', '.join(vary)))
+        etag = h.get('etag') or f'"{len(body):x}-{zlib.crc32(body):08x}"'
+        if not etag.startswith('W/'): etag = 'W/' + etag # vale para qualquer codificação
+        headers.append(('ETag', etag))
+
+        if parse_etags(environ.get('HTTP_IF_NONE_MATCH')).contains_weak(unquote_etag(etag)[0]):
+            start_response('304 Not Modified', [(k, v) for k, v in headers if k.lower() != 'content-type'])
+            return []
+
+        enc = self.choose_encoding(environ) if len(body) >= self.min_size else None
+        if enc == 'br': body = brotli.compress(body, quality=4)
+        elif enc == 'gzip': body = gzip.compress(body, self.level)
+        if enc: headers.append(('Content-Encoding', enc))
+        headers.append(('Content-Length', str(len(body))))
+        start_response(status, headers, exc_info)
+        return [body]
+
+    def choose_encoding(self, environ):
+        aceita = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING'))
+        if brotli and aceita['br']: return 'br'
+        if aceita['gzip']: return 'gzip'
+        return None
@@ -3,6 +3,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from db_tuning import engine_options
+
 class Config:
     uri = os.getenv('DATABASE_URL', 'sqlite:///banco_final.db')
     
@@ -10,6 +12,7 @@ class Config:
         uri = uri.replace("postgres://", "postgresql://", 1)
         
     SQLALCHEMY_DATABASE_URI = uri
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(uri) # WAL no SQLite, pool/pre-ping no Postgres (db_tuning.py)
     SQLALCHEMY_TRACK_MODIFICATIONS = False 
 
     # --- Segurança ---
@@ -20,17 +23,74 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax' 
     PERMANENT_SESSION_LIFETIME = 3600
+    RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', '1') == '1' # o benchmark desliga
 
     # --- Arquivos ---
     basedir = os.path.abspath(os.path.dirname(__file__)) 
-    UPLOAD_FOLDER = os.path.join(basedir, 'static', 'uploads')
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(basedir, 'static', 'uploads'))
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'pdf', 'doc', 'docx', 'csv', 'xlsx'}
+    MAIL_ATTACH_MAX_SIZE = 2 * 1024 * 1024 # acima disso o e-mail leva um link assinado
+    UPLOAD_LINK_MAX_AGE = 30 * 24 * 3600
     
     # --- Email ---
-    MAIL_SERVER = 'smtp.gmail.com'
-    MAIL_PORT = 465  
+    # Para testar com um SMTP local: MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_SSL=0
+    MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
+    MAIL_PORT = int(os.getenv('MAIL_PORT', 465))
     MAIL_USE_TLS = False 
-    MAIL_USE_SSL = True  
+    MAIL_USE_SSL = os.getenv('MAIL_USE_SSL', '1') == '1'
     MAIL_USERNAME = os.getenv('MAIL_USERNAME')
-    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
\ No newline at end of file
+    MAIL_PASSWORD = os.getenv('MAIL_PASSWORD')
+    MAIL_WORKERS = int(os.getenv('MAIL_WORKERS', 2)) # threads de envio por processo
+    MAIL_BATCH_SIZE = 20
+    MAIL_MAX_ATTEMPTS = 6
+    MAIL_RETRY_BASE = 30 # segundos; dobra a cada tentativa
+
+    # --- Chat (push) ---
+    CHAT_EVENTS_DB = os.getenv('CHAT_EVENTS_DB') # padrão: instance/chat_events.db
+    CHAT_STREAM_TIMEOUT = 25
+    CHAT_STREAM_MAX = int(os.getenv('CHAT_STREAM_MAX', 8)) # esperas SSE/long-poll por worker; manter abaixo de --threads do Procfile
+    CHAT_POLL_INTERVAL = 3 # segundos (Retry-After) para quem cai no polling curto
+    CHAT_ARCHIVE_AFTER_DAYS = int(os.getenv('CHAT_ARCHIVE_AFTER_DAYS', 90)) # flask archive-chats
+    CHAT_ARCHIVE_BATCH_SIZE = 200 # sessões por transação
+
+    # --- Visitas (gravação em lote) ---
+    VISIT_FLUSH_INTERVAL = 5 # segundos
+    VISIT_FLUSH_SIZE = 500
+
+    # --- Compressão das respostas (compression.CompressMiddleware) ---
+    COMPRESS_MIN_SIZE = 1024 # bytes; abaixo disso o gzip não compensa
+    COMPRESS_LEVEL = 6
+
+    # --- Métricas ---
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN') # sem token, /metrics só para admin logado
+    METRICS_DIR = os.getenv('METRICS_DIR') # padrão: instance/metrics (um arquivo por worker)
+    METRICS_FLUSH_INTERVAL = 5 # segundos
+    METRICS_SLOW_REQUEST = float(os.getenv('METRICS_SLOW_REQUEST', 1.0)) # segundos; loga as consultas SQL
+
+    # --- Cache da home ---
+    PAGE_CACHE_VERSION_FILE = os.getenv('PAGE_CACHE_VERSION_FILE') # padrão: instance/site_version
+
+    # --- Cache do user_loader (user_cache.py) ---
+    USER_CACHE_VERSION_FILE = os.getenv('USER_CACHE_VERSION_FILE') # padrão: instance/users_version
+    USER_CACHE_TTL = 60 # segundos
+    USER_CACHE_SIZE = 1024 # usuários por worker
+
+    # --- Avaliações públicas ---
+    REVIEWS_PAGE_SIZE = 12 # por página da rolagem infinita
+
+    # --- Painel admin ---
+    ADMIN_PAGE_SIZE = 50
+    SEARCH_PAGE_SIZE = 20
+    SEARCH_RANK_LIMIT = 20000 # ocorrências; acima disso a busca ordena por data em vez de relevância
+
+    # --- Séries temporais dos clientes (timeseries.py) ---
+    TIMESERIES_MAX_POINTS = 1000 # por resposta de /client/metrics
+    TIMESERIES_RAW_LIMIT = 20000 # acima disso o intervalo sai dos agregados mensais
+
+    # --- Importação CSV (imports.ImportQueue) ---
+    IMPORT_FOLDER = os.getenv('IMPORT_FOLDER') # padrão: instance/imports
+    IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', 1)) # threads por processo
+    IMPORT_CHUNK_SIZE = 1000 # linhas por transação
+    IMPORT_INLINE_MAX_SIZE = 256 * 1024 # bytes; acima disso vira job em segundo plano
+    IMPORT_MAX_ERRORS = 1000 # linhas com erro guardadas no relatório
@@ -0,0 +1,132 @@
+"""Gerador de dados sintéticos para testar o site em escala.
+
+Insere usuários (com ClientPlan, ClientStat e uma série diária em
+ClientMetric), leads, visitas, pedidos, avaliações e sessões de chat com
+conversas longas, tudo por INSERT do Core em lotes de ``batch_size`` linhas
+(executemany, um commit por lote), sem passar pela ORM. Os ids são calculados
+a partir do maior id existente, então as chaves estrangeiras saem sem precisar
+de RETURNING e o gerador pode rodar de novo sobre um banco já populado; no
+PostgreSQL as sequências dessas tabelas são avançadas até o maior id no fim da
+carga, senão o próximo INSERT da aplicação colidiria. No fim os rollups do dashboard, os agregados mensais dos clientes e o índice de busca
+são recalculados.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+from itertools import islice
+
+from sqlalchemy import func, insert, select, text
+from werkzeug.security import generate_password_hash
+
+from models import db, User, ClientPlan, ClientStat, ClientMetric, Lead, Visit, Order, Review, ChatSession, ChatMessage
+from analytics import rebuild_rollups
+from timeseries import rebuild_monthly
+import search
+import chat_inbox
+
+NOMES = ('Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Isabela', 'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vanessa', 'Yuri')
+SOBRENOMES = ('Silva', 'Souza', 'Oliveira', 'Santos', 'Lima', 'Costa', 'Pereira', 'Almeida', 'Ferreira', 'Rocha')
+EMPRESAS = ('Padaria Central', 'Studio Fit', 'Clínica Sorriso', 'Auto Peças Sul', 'Café Aroma', 'Loja Bella', 'Tech Norte', 'Pet Feliz')
+PLANOS = (('Starter', '2.000'), ('Growth', '3.200'), ('Performance', '4.500'))
+PAGINAS = ('home', 'home', 'home', 'home', 'avaliacoes', 'termos', 'checkout')
+CATEGORIAS = ('Orçamento', 'Suporte', 'Financeiro', 'Geral')
+FRASES = ('Olá, tudo bem?', 'Gostaria de um orçamento.', 'Qual o prazo de entrega?', 'Pode me enviar a proposta?',
+          'Perfeito, obrigado!', 'Vou verificar e retorno.', 'Os anúncios já estão no ar.', 'Segue o relatório do mês.')
+
+
+def _nome(rnd):
+    return f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}"
+
+
+def _quando(rnd, agora, dias):
+    return agora - timedelta(seconds=rnd.randrange(dias * 86400))
+
+
+def _next_id(model):
+    return (db.session.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def _sync_sequences(*models):
+    """No PostgreSQL, leva a sequência do id de cada tabela até o maior id gravado."""
+    if db.engine.dialect.name != 'postgresql': return
+    quote = db.engine.dialect.identifier_preparer.quote
+    for model in models:
+        tabela = quote(model.__table__.name)
+        db.session.execute(text(f"SELECT setval(pg_get_serial_sequence(:tabela, 'id'), MAX(id)) FROM {tabela} HAVING MAX(id) IS NOT NULL"),
+                           {'tabela': tabela})
+    db.session.commit()
+
+
+def _bulk(model, rows, batch_size, progress):
+    """Insere as linhas do iterável em lotes; devolve o total inserido."""
+    total = 0
+    tabela = model.__table__
+    while (lote := list(islice(rows, batch_size))):
+        db.session.execute(insert(tabela), lote)
+        db.session.commit()
+        total += len(lote)
+        progress(tabela.name, total)
+    return total
+
+
+def generate_data(users=100, leads=10000, visits=100000, orders=2000, reviews=2000, sessions=5000,
+                  messages=40, metric_days=730, days=365, batch_size=10000, seed=None, progress=lambda tabela, n: None):
+    """Gera o volume pedido e devolve {tabela: linhas inseridas}."""
+    rnd = random.Random(seed)
+    agora = datetime.now()
+    feito = {}
+
+    # Usuários: um hash só (gerar um por linha custaria minutos)
+    senha = generate_password_hash('senha123')
+    primeiro = _next_id(User)
+    user_ids = range(primeiro, primeiro + users)
+    feito['user'] = _bulk(User, ({'id': i, 'username': f'cliente_{i}', 'name': _nome(rnd), 'role': 'client', 'password_hash': senha} for i in user_ids), batch_size, progress)
+    feito['client_plan'] = _bulk(ClientPlan, ({'user_id': i, 'plan_name': rnd.choice(PLANOS)[0], 'benefits': '["Suporte", "Relatório mensal"]'} for i in user_ids), batch_size, progress)
+    feito['client_stat'] = _bulk(ClientStat, ({'user_id': i, 'label': f'Mês {m}', 'value': round(rnd.uniform(0, 100) * m, 1), 'type': 'growth'} for i in user_ids for m in range(1, 13)), batch_size, progress)
+
+    # Séries diárias de cada cliente: passeio aleatório com sazonalidade semanal
+    hoje = datetime(agora.year, agora.month, agora.day)
+    def pontos():
+        for i in user_ids:
+            valor = rnd.uniform(50, 500)
+            for d in range(metric_days, 0, -1):
+                valor = max(0.0, valor * rnd.uniform(0.97, 1.035))
+                quando = hoje - timedelta(days=d)
+                yield {'user_id': i, 'metric': 'visitas', 'ts': quando, 'value': round(valor * (0.7 if quando.weekday() >= 5 else 1), 1)}
+    feito['client_metric'] = _bulk(ClientMetric, pontos(), batch_size, progress)
+
+    feito['lead'] = _bulk(Lead, ({'nome': _nome(rnd), 'email': f'lead{n}@exemplo.com', 'telefone': f'119{rnd.randrange(10**8):08d}',
+                                 'projeto': rnd.choice(FRASES), 'data': _quando(rnd, agora, days)} for n in range(leads)), batch_size, progress)
+    feito['visit'] = _bulk(Visit, ({'page': rnd.choice(PAGINAS), 'date': _quando(rnd, agora, days)} for _ in range(visits)), batch_size, progress)
+    feito['order'] = _bulk(Order, ({'id': str(uuid.UUID(int=rnd.getrandbits(128), version=4)), 'plano': p, 'preco': v, 'status': rnd.choice(('Pendente', 'Pago', 'Pago', 'Cancelado')),
+                                   'metodo': rnd.choice(('pix', 'cartao', 'boleto')), 'data': _quando(rnd, agora, days)}
+                                  for p, v in (rnd.choice(PLANOS) for _ in range(orders))), batch_size, progress)
+    feito['review'] = _bulk(Review, ({'nome': _nome(rnd), 'empresa': rnd.choice(EMPRESAS), 'email': f'review{n}@exemplo.com', 'avaliacao': rnd.choice(FRASES),
+                                     'estrelas': rnd.choice((3, 4, 5, 5, 5)), 'visivel': rnd.random() < 0.8, 'data': _quando(rnd, agora, days)} for n in range(reviews)), batch_size, progress)
+
+    # Sessões de chat: metade do site, metade de clientes; as mensagens seguem o horário da sessão
+    primeira = _next_id(ChatSession)
+    inicio = {}
+    def sessoes():
+        for sid in range(primeira, primeira + sessions):
+            inicio[sid] = quando = _quando(rnd, agora, days)
+            dono = rnd.choice(user_ids) if users and rnd.random() < 0.5 else None
+            aberta = rnd.random() < 0.1
+            yield {'id': sid, 'session_uuid': uuid.UUID(int=rnd.getrandbits(128), version=4).hex, 'category': rnd.choice(CATEGORIAS),
+                   'status': 'Aberto' if aberta else 'Encerrado', 'client_name': _nome(rnd), 'client_phone': None,
+                   'user_id': dono, 'created_at': quando, 'closed_at': None if aberta else quando + timedelta(days=1)}
+    feito['chat_session'] = _bulk(ChatSession, sessoes(), batch_size, progress)
+    def mensagens():
+        for sid in range(primeira, primeira + sessions):
+            quando = inicio[sid]
+            for m in range(rnd.randint(max(1, messages // 2), messages * 3 // 2)):
+                quando += timedelta(seconds=rnd.randint(5, 900))
+                yield {'session_id': sid, 'tipo': 'texto', 'conteudo': rnd.choice(FRASES), 'remetente': 'user' if m % 2 == 0 else 'admin', 'data': quando}
+    feito['chat_message'] = _bulk(ChatMessage, mensagens(), batch_size, progress)
+    _sync_sequences(User, ChatSession)
+    chat_inbox.rebuild()
+
+    rebuild_rollups()
+    rebuild_monthly()
+    search.rebuild()
+    return feito
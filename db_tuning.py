@@ -0,0 +1,143 @@
+"""Perfis de engine por banco: SQLite em WAL e Postgres com pool ajustado.
+
+``engine_options(uri)`` monta o SQLALCHEMY_ENGINE_OPTIONS pelo esquema da URI:
+
+* SQLite: ``busy_timeout`` do driver (quem encontra o banco travado espera em
+  vez de falhar com "database is locked") e, a cada conexão nova, os PRAGMAs de
+  SQLITE_PRAGMAS: WAL (leitores não bloqueiam o escritor), ``synchronous=NORMAL``
+  (seguro em WAL, sem fsync por commit) e ``mmap_size``.
+* Postgres: tamanho do pool e overflow, reciclagem de conexões e pre-ping (a
+  conexão derrubada pelo servidor é trocada antes de dar erro no request).
+
+O ``statement_timeout`` do Postgres vale só para requests web: um listener de
+``after_begin`` faz ``SET LOCAL`` em cada transação aberta dentro de um request.
+Comandos de CLI (rebuild-search, archive-chats, generate-data...), o Alembic e
+as filas em segundo plano (e-mail, importação) usam o mesmo engine sem limite.
+
+Os valores vêm de variáveis de ambiente; ``DB_TUNING=0`` volta ao padrão do
+SQLAlchemy (usado pelo benchmark abaixo para comparar).
+
+    python -m db_tuning --processes 4 --threads 8 --seconds 10
+"""
+import os
+import sqlite3
+
+from flask import has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+TUNING = os.getenv('DB_TUNING', '1') == '1'
+SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000)) # Postgres, só em requests; 0 desliga
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': SQLITE_BUSY_TIMEOUT,
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+}
+
+
+def engine_options(uri):
+    if not TUNING: return {}
+    if uri.startswith('sqlite'):
+        return {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT / 1000}}
+    if uri.startswith('postgresql'):
+        return {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+            'pool_pre_ping': True,
+            'connect_args': {'connect_timeout': 10},
+        }
+    return {}
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_pragmas(dbapi_conn, connection_record):
+    if not TUNING or not isinstance(dbapi_conn, sqlite3.Connection): return
+    cur = dbapi_conn.cursor()
+    for nome, valor in SQLITE_PRAGMAS.items():
+        cur.execute(f'PRAGMA {nome}={valor}')
+    cur.close()
+
+
+@event.listens_for(Session, 'after_begin')
+def _request_statement_timeout(session, transaction, connection):
+    # SET LOCAL some no fim da transação; cada transação do request ganha o seu
+    if TUNING and STATEMENT_TIMEOUT and connection.dialect.name == 'postgresql' and has_request_context():
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {STATEMENT_TIMEOUT}')
+
+
+# --- Benchmark de escrita concorrente ---
+def _writer(uri, threads, seconds, fila):
+    """Um "worker": ``threads`` threads gravando mensagens de chat em transações curtas."""
+    import threading
+    import time
+    from datetime import datetime
+    from sqlalchemy import create_engine, func, insert, select
+    from sqlalchemy.exc import OperationalError
+    from models import ChatMessage
+
+    engine = create_engine(uri, **engine_options(uri))
+    t = ChatMessage.__table__
+    fim = time.monotonic() + seconds
+    totais = {'commits': 0, 'locked': 0}
+    lock = threading.Lock()
+    def loop():
+        ok = falhas = 0
+        while time.monotonic() < fim:
+            try:
+                with engine.begin() as conn: # uma mensagem e a leitura do cursor, como o send_chat + get_messages
+                    conn.execute(insert(t).values(session_id=1, tipo='texto', conteudo='x' * 80, remetente='user', data=datetime.now()))
+                    conn.execute(select(func.max(t.c.id)).where(t.c.session_id == 1)).scalar()
+                ok += 1
+            except OperationalError:
+                falhas += 1
+        with lock:
+            totais['commits'] += ok
+            totais['locked'] += falhas
+    ths = [threading.Thread(target=loop) for _ in range(threads)]
+    for th in ths: th.start()
+    for th in ths: th.join()
+    engine.dispose()
+    fila.put(totais)
+
+
+def _run_profile(tuning, processes, threads, seconds):
+    import multiprocessing
+    import tempfile
+    global TUNING
+    TUNING = tuning
+    pasta = tempfile.mkdtemp(prefix='db-tuning-')
+    uri = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+    from sqlalchemy import create_engine
+    from models import ChatMessage
+    engine = create_engine(uri)
+    ChatMessage.__table__.create(engine)
+    engine.dispose()
+    ctx = multiprocessing.get_context('fork')
+    fila = ctx.Queue()
+    procs = [ctx.Process(target=_writer, args=(uri, threads, seconds, fila)) for _ in range(processes)]
+    for p in procs: p.start()
+    resultados = [fila.get() for _ in procs]
+    for p in procs: p.join()
+    return {k: sum(r[k] for r in resultados) for k in ('commits', 'locked')}
+
+
+def main(argv=None):
+    import argparse
+    ap = argparse.ArgumentParser(description='Vazão de escrita concorrente no SQLite, sem e com o perfil ajustado.')
+    ap.add_argument('--processes', type=int, default=4, help='processos (workers do gunicorn)')
+    ap.add_argument('--threads', type=int, default=8, help='threads por processo')
+    ap.add_argument('--seconds', type=float, default=10)
+    args = ap.parse_args(argv)
+    print(f"{args.processes} processo(s) x {args.threads} thread(s), {args.seconds:g} s por perfil")
+    for nome, tuning in (('padrão (journal DELETE)', False), ('ajustado (WAL)', True)):
+        r = _run_profile(tuning, args.processes, args.threads, args.seconds)
+        print(f"{nome:24} {r['commits'] / args.seconds:9.1f} commits/s   {r['locked']:6} 'database is locked'")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""Exportação em stream (CSV e XLSX) de leads, vendas, avaliações e conversas do chat.
+
+As linhas vêm do banco com ``yield_per`` (cursor do lado do servidor no
+Postgres) e saem pela resposta à medida que são lidas: a memória fica
+constante qualquer que seja o tamanho da exportação e os primeiros bytes vão
+para o navegador logo no início. O XLSX é montado sem dependências: o zip é
+escrito num buffer que o gerador esvazia a cada lote de linhas, e as células
+usam strings inline (sem tabela de strings compartilhadas para acumular).
+
+As conversas arquivadas (chat_archive.py) não têm mais linhas em
+``chat_message``: a exportação 'chats' lê o histórico delas do ChatArchive,
+sessão a sessão, e intercala com as demais pela ordem do ticket.
+"""
+import csv
+import heapq
+import io
+import re
+import zipfile
+from datetime import datetime, timedelta
+from xml.sax.saxutils import escape
+
+from sqlalchemy import select
+
+from models import db, Lead, Order, Review, ChatSession, ChatMessage, ChatArchive
+import chat_archive
+
+YIELD_PER = 1000
+ARCHIVE_YIELD_PER = 50 # sessões arquivadas (cada linha traz o histórico comprimido)
+FLUSH_ROWS = 500
+
+# nome -> (colunas [(cabeçalho, expressão)], coluna de data, ordenação)
+EXPORTS = {
+    'leads': lambda: ([('Data', Lead.data), ('Nome', Lead.nome), ('E-mail', Lead.email), ('Telefone', Lead.telefone), ('Projeto', Lead.projeto)],
+                      Lead.data, (Lead.data, Lead.id)),
+    'orders': lambda: ([('Data', Order.data), ('Pedido', Order.id), ('Plano', Order.plano), ('Valor', Order.preco), ('Método', Order.metodo), ('Status', Order.status)],
+                       Order.data, (Order.data, Order.id)),
+    'reviews': lambda: ([('Data', Review.data), ('Nome', Review.nome), ('Empresa', Review.empresa), ('E-mail', Review.email), ('Estrelas', Review.estrelas),
+                         ('Avaliação', Review.avaliacao), ('Visível', Review.visivel)],
+                        Review.data, (Review.data, Review.id)),
+    'chats': lambda: ([('Ticket', ChatSession.id), ('Cliente', ChatSession.client_name), ('Telefone', ChatSession.client_phone), ('Categoria', ChatSession.category),
+                       ('Status', ChatSession.status), ('Data', ChatMessage.data), ('Remetente', ChatMessage.remetente), ('Tipo', ChatMessage.tipo), ('Mensagem', ChatMessage.conteudo)],
+                      ChatMessage.data, (ChatMessage.session_id, ChatMessage.id)),
+}
+
+
+def parse_range(inicio, fim):
+    """Datas 'AAAA-MM-DD' da query string; ``fim`` é inclusivo. Levanta ValueError se inválidas."""
+    ini = datetime.strptime(inicio, '%Y-%m-%d') if inicio else None
+    ate = datetime.strptime(fim, '%Y-%m-%d') + timedelta(days=1) if fim else None
+    return ini, ate
+
+
+def export_rows(name, inicio=None, fim=None):
+    """(cabeçalho, iterador de linhas) da exportação ``name`` no intervalo [inicio, fim)."""
+    colunas, coluna_data, ordem = EXPORTS[name]()
+    stmt = select(*[c for _, c in colunas]).order_by(*ordem)
+    if name == 'chats': stmt = stmt.select_from(ChatMessage).join(ChatSession, ChatSession.id == ChatMessage.session_id)
+    if inicio: stmt = stmt.where(coluna_data >= inicio)
+    if fim: stmt = stmt.where(coluna_data < fim)
+    result = db.session.execute(stmt.execution_options(yield_per=YIELD_PER))
+    linhas = (tuple(r) for r in result)
+    if name == 'chats': linhas = heapq.merge(_archived_chats(inicio, fim), linhas, key=lambda r: r[0])
+    return [h for h, _ in colunas], linhas
+
+
+def _archived_chats(inicio, fim):
+    """Linhas da exportação 'chats' das sessões arquivadas, por ticket, com as mesmas colunas."""
+    stmt = select(ChatSession.id, ChatSession.client_name, ChatSession.client_phone, ChatSession.category, ChatSession.status, ChatArchive.data) \
+        .join(ChatArchive, ChatArchive.session_id == ChatSession.id).order_by(ChatSession.id)
+    if inicio: stmt = stmt.where(ChatSession.closed_at >= inicio) # as mensagens são de antes do encerramento
+    for *sessao, blob in db.session.execute(stmt.execution_options(yield_per=ARCHIVE_YIELD_PER)):
+        for m in chat_archive.unpack(blob):
+            if (inicio or fim) and m.data is None: continue
+            if (not inicio or m.data >= inicio) and (not fim or m.data < fim):
+                yield (*sessao, m.data, m.remetente, m.tipo, m.conteudo)
+
+
+def _text(v):
+    if v is None: return ''
+    if isinstance(v, datetime): return v.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(v, bool): return 'sim' if v else 'não'
+    return str(v)
+
+
+def csv_stream(header, rows):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    buf.write('\ufeff') # BOM: o Excel abre com acentuação correta
+    w.writerow(header)
+    for n, row in enumerate(rows, 1):
+        if n % FLUSH_ROWS == 1: # cabeçalho sai já; depois um pedaço a cada FLUSH_ROWS linhas
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+        w.writerow([_text(v) for v in row])
+    yield buf.getvalue()
+
+
+# --- XLSX ---
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_COLS = [chr(65 + i) for i in range(26)]
+
+_CONTENT_TYPES = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                  '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+                  '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+                  '<Default Extension="xml" ContentType="application/xml"/>'
+                  '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+                  '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                  '</Types>')
+_RELS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+         '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+         '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+         '</Relationships>')
+_WORKBOOK = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+             '<sheets><sheet name="{nome}" sheetId="1" r:id="rId1"/></sheets></workbook>')
+_WORKBOOK_RELS = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                  '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                  '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+                  '</Relationships>')
+
+
+class _Drain(io.RawIOBase):
+    """Destino do zip que só acumula bytes até o gerador buscá-los (não é seekable)."""
+
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.parts.append(bytes(b))
+        return len(b)
+
+    def take(self):
+        dados, self.parts = b''.join(self.parts), []
+        return dados
+
+
+def _cell(ref, v):
+    if isinstance(v, (int, float)) and not isinstance(v, bool):
+        return f'<c r="{ref}"><v>{v}</v></c>'
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(_INVALID_XML.sub("", _text(v)))}</t></is></c>'
+
+
+def _row(n, valores):
+    return f'<row r="{n}">' + ''.join(_cell(f'{_COLS[i]}{n}', v) for i, v in enumerate(valores)) + '</row>'
+
+
+def xlsx_stream(header, rows, sheet='Dados'):
+    saida = _Drain()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        zf.writestr('_rels/.rels', _RELS)
+        zf.writestr('xl/workbook.xml', _WORKBOOK.format(nome=escape(sheet)))
+        zf.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as fp:
+            fp.write(('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                      + _row(1, header)).encode())
+            yield saida.take()
+            for n, row in enumerate(rows, 2):
+                fp.write(_row(n, row).encode())
+                if n % FLUSH_ROWS == 0: yield saida.take()
+            fp.write(b'</sheetData></worksheet>')
+    yield saida.take()
+
+
+FORMATS = {
+    'csv': (csv_stream, 'text/csv; charset=utf-8'),
+    'xlsx': (xlsx_stream, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
@@ -0,0 +1,294 @@
+"""Importação em lote por CSV: clientes (User + ClientPlan), métricas dos clientes (ClientStat e
+séries temporais de ClientMetric) e leads.
+
+O arquivo é lido em stream pelo módulo csv, em lotes de IMPORT_CHUNK_SIZE
+linhas. Cada linha é validada sozinha (as inválidas vão para o relatório com o
+número da linha e o motivo) e cada lote é gravado com comandos em conjunto: um
+SELECT ... IN para resolver os logins e um executemany de INSERT ... ON
+CONFLICT DO UPDATE por tabela, em vez de um objeto da ORM por linha. O
+progresso do job (linhas lidas, bytes, erros) é gravado na mesma transação do
+lote, então um job interrompido retoma do último lote gravado.
+
+Arquivos até IMPORT_INLINE_MAX_SIZE são importados no próprio request; os
+maiores ficam pendentes para as threads do ``ImportQueue``, que reservam o job
+de forma atômica (seguro entre workers do gunicorn, como no mailer).
+"""
+import csv
+import io
+import json
+import os
+import threading
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import bindparam, insert, or_, and_, select, update
+from werkzeug.security import generate_password_hash
+
+import user_cache
+from timeseries import record
+from search import index_rows
+from models import db, upsert, upsert_increment, User, ClientPlan, ClientStat, Lead, DailyStat, ImportJob
+
+DATE_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+
+# --- Validação de campos ---
+def _texto(linha, campo, maximo, obrigatorio=False):
+    v = (linha.get(campo) or '').strip()
+    if obrigatorio and not v: raise ValueError(f"'{campo}' é obrigatório")
+    if len(v) > maximo: raise ValueError(f"'{campo}' passa de {maximo} caracteres")
+    return v
+
+
+def _numero(linha, campo):
+    v = (linha.get(campo) or '').strip()
+    if ',' in v: v = v.replace('.', '').replace(',', '.') # 1.234,5
+    try: return float(v)
+    except ValueError: raise ValueError(f"'{campo}' não é um número: {v!r}") from None
+
+
+def _data(linha, campo):
+    v = (linha.get(campo) or '').strip()
+    if not v: return datetime.now()
+    for fmt in DATE_FORMATS:
+        try: return datetime.strptime(v, fmt)
+        except ValueError: pass
+    raise ValueError(f"'{campo}' não é uma data válida: {v!r}")
+
+
+def _grouped(rows):
+    """Agrupa as linhas pelo conjunto de colunas: um executemany por grupo (campos vazios não sobrescrevem)."""
+    grupos = {}
+    for r in rows: grupos.setdefault(tuple(r), []).append(r)
+    return grupos.values()
+
+
+# --- Tipos de importação: parse(linha) -> dados ou ValueError; apply(conn, [(n, dados)]) -> [(n, erro)] ---
+def _parse_client(linha):
+    beneficios = _texto(linha, 'benefits', 2000)
+    senha = (linha.get('password') or '').strip()
+    return {'username': _texto(linha, 'username', 80, True), 'name': _texto(linha, 'name', 100),
+            'password_hash': generate_password_hash(senha) if senha else '',
+            'plan_name': _texto(linha, 'plan_name', 50),
+            'benefits': json.dumps([b.strip() for b in beneficios.split(',') if b.strip()]) if beneficios else ''}
+
+
+def _apply_clients(conn, linhas):
+    por_login = {}
+    for n, d in linhas: # login repetido: campos preenchidos na linha seguinte sobrescrevem, como entre lotes
+        if d['username'] in por_login: por_login[d['username']][1].update({k: v for k, v in d.items() if v})
+        else: por_login[d['username']] = (n, dict(d))
+    papeis = dict(conn.execute(select(User.username, User.role).where(User.username.in_(por_login))).all())
+    erros, novos, existentes = [], [], []
+    for login, (n, d) in list(por_login.items()):
+        papel = papeis.get(login)
+        if papel is None and d['password_hash']:
+            novos.append({'username': login, 'name': d['name'] or login, 'password_hash': d['password_hash'], 'role': 'client'})
+        elif papel == 'client':
+            existentes.append({'_login': login, **{c: d[c] for c in ('name', 'password_hash') if d[c]}})
+        else:
+            erros.append((n, "'password' é obrigatório para cliente novo" if papel is None else f"o login '{login}' não é de um cliente"))
+            del por_login[login]
+    upsert(User, ['username'], novos, conn=conn)
+    # Já existentes: UPDATE só das colunas preenchidas (o INSERT do upsert exigiria a senha)
+    t = User.__table__
+    for grupo in _grouped(u for u in existentes if len(u) > 1):
+        conn.execute(t.update().where(t.c.username == bindparam('_login')), grupo)
+    if novos or existentes: user_cache.invalidate(db.session) # o commit do lote troca a versão (retratos com nome antigo)
+
+    ids = dict(conn.execute(select(User.username, User.id).where(User.username.in_(por_login))).all())
+    planos = []
+    for login, (n, d) in por_login.items():
+        p = {'user_id': ids[login]}
+        if d['plan_name']: p['plan_name'] = d['plan_name']
+        if d['benefits'] or login not in papeis: p['benefits'] = d['benefits'] or json.dumps(["Suporte"])
+        planos.append(p)
+    for grupo in _grouped(planos): upsert(ClientPlan, ['user_id'], grupo, conn=conn)
+    return erros
+
+
+def _parse_stat(linha):
+    return {'username': _texto(linha, 'username', 80, True), 'label': _texto(linha, 'label', 50, True),
+            'value': _numero(linha, 'value'), 'type': _texto(linha, 'type', 20) or 'growth'}
+
+
+def _apply_stats(conn, linhas):
+    logins = {d['username'] for _, d in linhas}
+    ids = dict(conn.execute(select(User.username, User.id).where(User.username.in_(logins), User.role == 'client')).all())
+    erros, stats = [], {}
+    for n, d in linhas:
+        if d['username'] not in ids: erros.append((n, f"cliente '{d['username']}' não encontrado"))
+        else: stats[(ids[d['username']], d['type'], d['label'])] = d['value']
+    upsert(ClientStat, ['user_id', 'type', 'label'], [{'user_id': u, 'type': t, 'label': l, 'value': v} for (u, t, l), v in stats.items()], conn=conn)
+    return erros
+
+
+def _parse_metric(linha):
+    if not (linha.get('ts') or '').strip(): raise ValueError("'ts' é obrigatório")
+    return {'username': _texto(linha, 'username', 80, True), 'metric': _texto(linha, 'metric', 30, True),
+            'ts': _data(linha, 'ts'), 'value': _numero(linha, 'value')}
+
+
+def _apply_metrics(conn, linhas):
+    logins = {d['username'] for _, d in linhas}
+    ids = dict(conn.execute(select(User.username, User.id).where(User.username.in_(logins), User.role == 'client')).all())
+    erros = [(n, f"cliente '{d['username']}' não encontrado") for n, d in linhas if d['username'] not in ids]
+    record([{'user_id': ids[d['username']], 'metric': d['metric'], 'ts': d['ts'], 'value': d['value']} for _, d in linhas if d['username'] in ids], conn=conn)
+    return erros
+
+
+def _parse_lead(linha):
+    email = _texto(linha, 'email', 100)
+    if email and '@' not in email: raise ValueError(f"'email' inválido: {email!r}")
+    return {'nome': _texto(linha, 'nome', 100, True), 'email': email, 'telefone': _texto(linha, 'telefone', 20),
+            'projeto': _texto(linha, 'projeto', 10000), 'data': _data(linha, 'data')}
+
+
+def _apply_leads(conn, linhas):
+    if not linhas: return []
+    t = Lead.__table__
+    dados = [d for _, d in linhas]
+    ids = conn.execute(insert(t).returning(t.c.id, sort_by_parameter_order=True), dados).scalars().all()
+    # Core não passa pelos after_flush: índice de busca e contadores diários são atualizados aqui
+    index_rows(conn, 'lead', zip(ids, dados))
+    por_dia = Counter(d['data'].date() for _, d in linhas)
+    upsert_increment(DailyStat, ['metric', 'day'], [{'metric': 'leads', 'day': dia, 'count': n} for dia, n in por_dia.items()], conn=conn)
+    return []
+
+
+# tipo -> (colunas obrigatórias, colunas opcionais, parse, apply, pode rodar no request)
+# Clientes sempre vão para o job: o hash de cada senha custa ~0,1 s.
+IMPORTS = {
+    'clients': (('username',), ('name', 'password', 'plan_name', 'benefits'), _parse_client, _apply_clients, False),
+    'stats': (('username', 'label', 'value'), ('type',), _parse_stat, _apply_stats, True),
+    'metrics': (('username', 'metric', 'ts', 'value'), (), _parse_metric, _apply_metrics, True),
+    'leads': (('nome',), ('email', 'telefone', 'projeto', 'data'), _parse_lead, _apply_leads, True),
+}
+
+
+class ImportQueue:
+    def __init__(self, app=None):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.folder = app.config.get('IMPORT_FOLDER') or os.path.join(app.instance_path, 'imports')
+        self.workers = app.config.get('IMPORT_WORKERS', 1)
+        self.chunk_size = app.config.get('IMPORT_CHUNK_SIZE', 1000)
+        self.inline_max_size = app.config.get('IMPORT_INLINE_MAX_SIZE', 256 * 1024)
+        self.max_errors = app.config.get('IMPORT_MAX_ERRORS', 1000)
+        self.poll_interval = app.config.get('IMPORT_POLL_INTERVAL', 30)
+        self.stale_after = timedelta(seconds=app.config.get('IMPORT_CLAIM_TIMEOUT', 600))
+        os.makedirs(self.folder, exist_ok=True)
+        app.extensions['import_queue'] = self
+        # as threads só sobem no primeiro request (depois do fork do gunicorn)
+        app.before_request(self.start)
+
+    def submit(self, kind, file):
+        """Grava o upload e cria o job; arquivo pequeno é importado já, o grande fica para as threads."""
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.folder, f'{job_id}.csv')
+        file.save(path)
+        return self.create(kind, path, file.filename, job_id, inline=IMPORTS[kind][4] and os.path.getsize(path) <= self.inline_max_size)
+
+    def create(self, kind, path, filename=None, job_id=None, inline=True):
+        job = ImportJob(id=job_id or uuid.uuid4().hex, kind=kind, filename=(filename or os.path.basename(path))[:200],
+                        path=path, size=os.path.getsize(path))
+        if inline: job.status, job.claimed_at = 'processando', datetime.utcnow()
+        db.session.add(job)
+        db.session.commit()
+        if inline: self.run(job)
+        else: self.wake()
+        return job
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        if self._threads or not self.workers: return
+        with self._lock:
+            if self._threads: return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._loop, name=f'import-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _loop(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    while (job := self.claim()): self.run(job)
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.exception(f"Erro no worker de importação: {e}")
+                finally:
+                    db.session.remove()
+
+    def claim(self):
+        """Reserva o job pendente mais antigo (ou um parado há mais de IMPORT_CLAIM_TIMEOUT)."""
+        agora = datetime.utcnow()
+        pronto = or_(ImportJob.status == 'pendente',
+                     and_(ImportJob.status == 'processando', ImportJob.claimed_at < agora - self.stale_after))
+        job_id = db.session.scalar(select(ImportJob.id).where(pronto).order_by(ImportJob.created_at).limit(1))
+        if not job_id: return None
+        res = db.session.execute(update(ImportJob).where(ImportJob.id == job_id, pronto).values(status='processando', claimed_at=agora))
+        db.session.commit()
+        return db.session.get(ImportJob, job_id) if res.rowcount else None
+
+    def run(self, job):
+        """Importa o arquivo do job a partir do checkpoint (``processed``), um lote por transação."""
+        obrigatorias, _, parse, apply, _ = IMPORTS[job.kind]
+        erros = json.loads(job.errors or '[]')
+
+        def gravar(lote, erros_lote, lidas, posicao):
+            erros_apply = apply(db.session.connection(), lote)
+            erros_lote = sorted(erros_lote + erros_apply)
+            job.processed += lidas
+            job.position = min(posicao, job.size)
+            job.imported += len(lote) - len(erros_apply)
+            job.failed += len(erros_lote)
+            erros.extend({'linha': n, 'erro': e} for n, e in erros_lote[:self.max_errors - len(erros)])
+            job.errors = json.dumps(erros)
+            job.claimed_at = datetime.utcnow() # heartbeat: job com progresso não é reservado por outro worker
+            db.session.commit()
+
+        try:
+            with open(job.path, 'rb') as raw:
+                texto = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+                primeira = texto.readline()
+                delim = ';' if primeira.count(';') > primeira.count(',') else ',' # Excel em pt-BR exporta com ;
+                campos = [c.strip().lower() for c in next(csv.reader([primeira], delimiter=delim), [])]
+                faltando = [c for c in obrigatorias if c not in campos]
+                if faltando: raise ValueError(f"Coluna(s) obrigatória(s) ausente(s): {', '.join(faltando)}")
+                leitor = csv.DictReader(texto, fieldnames=campos, delimiter=delim)
+                lote, erros_lote, lidas = [], [], 0
+                for i, linha in enumerate(leitor, 1):
+                    if i <= job.processed: continue # retomando: lotes já gravados
+                    lidas += 1
+                    if any((v or '').strip() for k, v in linha.items() if k is not None):
+                        try: lote.append((leitor.line_num + 1, parse(linha)))
+                        except ValueError as e: erros_lote.append((leitor.line_num + 1, str(e)))
+                    if lidas == self.chunk_size:
+                        gravar(lote, erros_lote, lidas, raw.tell())
+                        lote, erros_lote, lidas = [], [], 0
+                gravar(lote, erros_lote, lidas, job.size)
+            job.status = 'concluido'
+        except Exception as e:
+            db.session.rollback()
+            job.status, job.last_error = 'falhou', str(e)[:500]
+            if not isinstance(e, (ValueError, csv.Error)): # arquivo inválido não é erro do servidor
+                self.app.logger.exception(f"Importação {job.id} falhou: {e}")
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        if os.path.dirname(job.path) == self.folder: # arquivos passados pela CLI ficam onde estão
+            try: os.remove(job.path)
+            except OSError: pass
+        return job
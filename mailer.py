@@ -0,0 +1,124 @@
+"""Fila persistente de e-mails (outbox).
+
+``enqueue`` grava a mensagem na tabela ``outbox_mail`` na mesma transação do
+request; depois do commit, ``wake`` acorda o pool de threads do processo. Cada
+thread reserva um lote (reserva atômica por token, segura entre workers), envia
+tudo por uma única conexão SMTP e registra o resultado. Falhas voltam para a
+fila com backoff exponencial até MAIL_MAX_ATTEMPTS, depois ficam como 'falhou'.
+"""
+import json
+import smtplib
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+from sqlalchemy import and_, or_, update
+
+from models import db, OutboxMail
+
+
+class MailQueue:
+    def __init__(self, mail, app=None):
+        self.mail = mail
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config.get('MAIL_WORKERS', 2)
+        self.batch_size = app.config.get('MAIL_BATCH_SIZE', 20)
+        self.max_attempts = app.config.get('MAIL_MAX_ATTEMPTS', 6)
+        self.retry_base = app.config.get('MAIL_RETRY_BASE', 30)
+        self.poll_interval = app.config.get('MAIL_POLL_INTERVAL', 30)
+        self.stale_after = timedelta(seconds=app.config.get('MAIL_CLAIM_TIMEOUT', 600))
+        app.extensions['mail_queue'] = self
+        # as threads só sobem no primeiro request (depois do fork do gunicorn)
+        app.before_request(self.start)
+
+    def enqueue(self, subject, recipients, html, sender=None, attachments=()):
+        """Adiciona a mensagem à sessão atual; quem chama faz o commit e depois ``wake()``.
+
+        ``attachments`` é uma lista de (nome, content_type, caminho) lida só na hora do envio.
+        """
+        m = OutboxMail(subject=subject, sender=sender, recipients=json.dumps(list(recipients)), html=html,
+                       attachments=json.dumps([{'filename': n, 'content_type': t, 'path': p} for n, t, p in attachments]))
+        db.session.add(m)
+        return m
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        if self._threads or not self.workers: return
+        with self._lock:
+            if self._threads: return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f'mail-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    while self.process_batch(): pass
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.exception(f"Erro no worker de e-mail: {e}")
+                finally:
+                    db.session.remove()
+
+    def claim(self):
+        """Reserva até ``batch_size`` mensagens prontas para envio e devolve-as."""
+        agora = datetime.utcnow()
+        pronta = or_(and_(OutboxMail.status == 'pendente', OutboxMail.next_attempt_at <= agora),
+                     and_(OutboxMail.status == 'enviando', OutboxMail.claimed_at < agora - self.stale_after))
+        ids = [i for (i,) in db.session.query(OutboxMail.id).filter(pronta).order_by(OutboxMail.id).limit(self.batch_size)]
+        if not ids: return []
+        token = uuid.uuid4().hex
+        db.session.execute(update(OutboxMail).where(OutboxMail.id.in_(ids), pronta)
+                           .values(status='enviando', claim_token=token, claimed_at=agora, attempts=OutboxMail.attempts + 1))
+        db.session.commit()
+        return OutboxMail.query.filter_by(claim_token=token).order_by(OutboxMail.id).all()
+
+    def process_batch(self):
+        """Envia um lote numa só conexão SMTP. Devolve quantas mensagens foram processadas."""
+        lote = self.claim()
+        if not lote: return 0
+        try:
+            with self.mail.connect() as conn:
+                for m in lote:
+                    try:
+                        conn.send(self.build_message(m))
+                        m.status, m.sent_at, m.last_error = 'enviado', datetime.utcnow(), None
+                    except Exception as e: # anexo sumido, remetente recusado, conexão caída...
+                        self._fail(m, e)
+        except (smtplib.SMTPException, OSError) as e:
+            for m in lote:
+                if m.status == 'enviando': self._fail(m, e)
+        db.session.commit()
+        return len(lote)
+
+    def build_message(self, m):
+        msg = Message(m.subject, sender=m.sender, recipients=json.loads(m.recipients))
+        msg.html = m.html
+        for a in json.loads(m.attachments or '[]'):
+            with open(a['path'], 'rb') as fp:
+                msg.attach(a['filename'], a['content_type'], fp.read())
+        return msg
+
+    def _fail(self, m, erro):
+        m.last_error = str(erro)[:500]
+        if m.attempts >= self.max_attempts:
+            m.status = 'falhou'
+            self.app.logger.error(f"E-mail {m.id} descartado após {m.attempts} tentativas: {erro}")
+        else:
+            m.status = 'pendente'
+            m.next_attempt_at = datetime.utcnow() + timedelta(seconds=self.retry_base * 2 ** (m.attempts - 1))
@@ -0,0 +1,211 @@
+"""Métricas por rota: latência, consultas SQL e tamanho da resposta, em formato Prometheus.
+
+Cada worker acumula os números em memória e grava um retrato em
+``instance/metrics/<pid>.json`` a cada METRICS_FLUSH_INTERVAL segundos (e no
+encerramento). ``render`` soma os retratos de todos os workers, então o
+``/metrics`` dá o total do servidor qualquer que seja o worker que atendeu o
+scrape; os outros workers aparecem com até um intervalo de atraso.
+
+Requests acima de METRICS_SLOW_REQUEST segundos vão para o log com as
+consultas SQL que executaram.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+SLOW_LOG_MAX_QUERIES = 50
+
+# nome -> (tipo, ajuda, buckets)
+METRICS = {
+    'http_requests_total': ('counter', 'Requests atendidos.', None),
+    'http_request_duration_seconds': ('histogram', 'Latência por rota.', LATENCY_BUCKETS),
+    'http_response_size_bytes': ('histogram', 'Tamanho do corpo da resposta (antes da compressão).', SIZE_BUCKETS),
+    'db_queries_per_request': ('histogram', 'Consultas SQL por request.', QUERY_BUCKETS),
+    'db_query_duration_seconds_total': ('counter', 'Tempo total gasto em SQL.', None),
+    'user_cache_lookups_total': ('counter', 'Consultas ao cache do user_loader (hit/miss).', None),
+}
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info['query_start'].pop()
+    if has_request_context():
+        consultas = g.get('sql_queries')
+        if consultas is not None: consultas.append((statement, time.perf_counter() - inicio))
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._counters = {} # (nome, labels) -> valor
+        self._hists = {}    # (nome, labels) -> [contagem por bucket..., soma, total]
+        self._dirty = False
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.dir = app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+        self.interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+        self.slow = app.config.get('METRICS_SLOW_REQUEST', 1.0)
+        self.skip = {'metrics_endpoint', 'static', 'asset'}
+        os.makedirs(self.dir, exist_ok=True)
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        app.extensions['metrics'] = self
+        atexit.register(self.flush)
+
+    # --- coleta ---
+    def _start_request(self):
+        g.request_start = time.perf_counter()
+        g.sql_queries = []
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._load()
+                    self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+                    self._thread.start()
+
+    def _end_request(self, response):
+        inicio = g.pop('request_start', None)
+        consultas = g.pop('sql_queries', [])
+        if inicio is None or request.endpoint in self.skip: return response
+        tempo = time.perf_counter() - inicio
+        rota = request.endpoint or '<sem rota>'
+        tempo_sql = sum(t for _, t in consultas)
+        with self._lock:
+            self._inc('http_requests_total', (('endpoint', rota), ('method', request.method), ('status', str(response.status_code))))
+            self._observe('http_request_duration_seconds', (('endpoint', rota),), tempo)
+            if response.content_length is not None: # streams (SSE, exportações) não têm tamanho
+                self._observe('http_response_size_bytes', (('endpoint', rota),), response.content_length)
+            self._observe('db_queries_per_request', (('endpoint', rota),), len(consultas))
+            self._inc('db_query_duration_seconds_total', (('endpoint', rota),), tempo_sql)
+            self._dirty = True
+        if tempo >= self.slow: self._log_slow(rota, tempo, tempo_sql, consultas)
+        return response
+
+    def inc(self, nome, labels=(), valor=1):
+        """Soma ``valor`` a um contador de METRICS fora do ciclo do request (caches, filas...)."""
+        with self._lock:
+            self._inc(nome, labels, valor)
+            self._dirty = True
+
+    def _inc(self, nome, labels, valor=1):
+        self._counters[(nome, labels)] = self._counters.get((nome, labels), 0) + valor
+
+    def _observe(self, nome, labels, valor):
+        buckets = METRICS[nome][2]
+        h = self._hists.get((nome, labels))
+        if h is None: h = self._hists[(nome, labels)] = [0] * (len(buckets) + 2)
+        for i, limite in enumerate(buckets):
+            if valor <= limite:
+                h[i] += 1
+                break
+        h[-2] += valor
+        h[-1] += 1
+
+    def _log_slow(self, rota, tempo, tempo_sql, consultas):
+        linhas = [f"Request lento: {request.method} {request.full_path} ({rota}) {tempo * 1000:.0f} ms, "
+                  f"{len(consultas)} consulta(s) SQL em {tempo_sql * 1000:.0f} ms"]
+        linhas += [f"  {t * 1000:7.1f} ms  {' '.join(s.split())}" for s, t in consultas[:SLOW_LOG_MAX_QUERIES]]
+        if len(consultas) > SLOW_LOG_MAX_QUERIES: linhas.append(f"  ... mais {len(consultas) - SLOW_LOG_MAX_QUERIES}")
+        self.app.logger.warning('\n'.join(linhas))
+
+    # --- retratos por worker ---
+    def _path(self, pid=None):
+        return os.path.join(self.dir, f"{pid or os.getpid()}.json")
+
+    def _snapshot(self):
+        with self._lock:
+            self._dirty = False
+            return {'counters': [[n, list(l), v] for (n, l), v in self._counters.items()],
+                    'hists': [[n, list(l), h[:]] for (n, l), h in self._hists.items()]}
+
+    def _load(self):
+        # um worker novo com o pid de um antigo continua de onde o outro parou (contadores não voltam)
+        try:
+            with open(self._path()) as fp: dados = json.load(fp)
+        except (OSError, ValueError):
+            return
+        for n, l, v in dados.get('counters', []): self._counters[(n, tuple(map(tuple, l)))] = v
+        for n, l, h in dados.get('hists', []): self._hists[(n, tuple(map(tuple, l)))] = h
+
+    def flush(self):
+        if not self._dirty: return
+        tmp = f"{self._path()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, 'w') as fp: json.dump(self._snapshot(), fp)
+        os.replace(tmp, self._path())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try: self.flush()
+            except OSError as e: self.app.logger.warning(f"Falha ao gravar métricas: {e}")
+
+    # --- exposição ---
+    def collect(self):
+        """Soma os retratos de todos os workers: ({(nome, labels): valor}, {(nome, labels): histograma})."""
+        self.flush()
+        counters, hists = {}, {}
+        for e in os.scandir(self.dir):
+            if not e.name.endswith('.json'): continue
+            try:
+                with open(e.path) as fp: dados = json.load(fp)
+            except (OSError, ValueError):
+                continue
+            for n, l, v in dados.get('counters', []):
+                k = (n, tuple(map(tuple, l)))
+                counters[k] = counters.get(k, 0) + v
+            for n, l, h in dados.get('hists', []):
+                k = (n, tuple(map(tuple, l)))
+                hists[k] = [a + b for a, b in zip(hists[k], h)] if k in hists else h
+        return counters, hists
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (0.0.4)."""
+        counters, hists = self.collect()
+        linhas = []
+        for nome, (tipo, ajuda, buckets) in METRICS.items():
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+            if tipo == 'counter':
+                linhas += [f"{nome}{_labels(l)} {_num(v)}" for (n, l), v in sorted(counters.items()) if n == nome]
+                continue
+            for (n, l), h in sorted(hists.items()):
+                if n != nome: continue
+                acumulado = 0
+                for limite, c in zip(buckets, h):
+                    acumulado += c
+                    linhas.append(f"{nome}_bucket{_labels(l + (('le', _num(limite)),))} {acumulado}")
+                linhas.append(f"{nome}_bucket{_labels(l + (('le', '+Inf'),))} {h[-1]}")
+                linhas.append(f"{nome}_sum{_labels(l)} {_num(h[-2])}")
+                linhas.append(f"{nome}_count{_labels(l)} {h[-1]}")
+        return '\n'.join(linhas) + '\n'
+
+
+def _labels(labels):
+    if not labels: return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}'
+
+
+def _escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _num(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
@@ -0,0 +1,42 @@
+"""client metric
+
+Revision ID: a2b4d6f8c931
+Revises: f1a3c8e5d720
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a2b4d6f8c931'
+down_revision = 'f1a3c8e5d720'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('client_metric',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(length=30), nullable=False),
+    sa.Column('ts', sa.DateTime(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'metric', 'ts', name='uq_client_metric_user_metric_ts')
+    )
+    op.create_table('client_metric_monthly',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('metric', sa.String(length=30), nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('min', sa.Float(), nullable=True),
+    sa.Column('max', sa.Float(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'metric', 'month')
+    )
+
+def downgrade():
+    op.drop_table('client_metric_monthly')
+    op.drop_table('client_metric')
@@ -0,0 +1,28 @@
+"""visit_daily rollup
+
+Revision ID: a7d91c3f2b10
+Revises: e3b2c1a4d5e6
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'a7d91c3f2b10'
+down_revision = 'e3b2c1a4d5e6'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('visit_daily',
+    sa.Column('page', sa.String(length=50), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('page', 'day')
+    )
+    # Carrega a contagem com o histórico já existente em visit
+    op.execute("INSERT INTO visit_daily (page, day, count) SELECT COALESCE(page, 'home'), date(date), COUNT(*) FROM visit WHERE date IS NOT NULL GROUP BY COALESCE(page, 'home'), date(date)")
+
+def downgrade():
+    op.drop_table('visit_daily')
@@ -0,0 +1,30 @@
+"""daily_stat rollups
+
+Revision ID: b3e8f05a6c21
+Revises: a7d91c3f2b10
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b3e8f05a6c21'
+down_revision = 'a7d91c3f2b10'
+branch_labels = None
+depends_on = None
+
+FONTES = [('visits', 'visit', 'date'), ('leads', 'lead', 'data'), ('orders', '"order"', 'data'), ('reviews', 'review', 'data'), ('chats', 'chat_session', 'created_at')]
+
+def upgrade():
+    op.create_table('daily_stat',
+    sa.Column('metric', sa.String(length=20), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('metric', 'day')
+    )
+    for metric, tabela, coluna in FONTES:
+        op.execute(f"INSERT INTO daily_stat (metric, day, count) SELECT '{metric}', date({coluna}), COUNT(*) FROM {tabela} WHERE {coluna} IS NOT NULL GROUP BY date({coluna})")
+
+def downgrade():
+    op.drop_table('daily_stat')
@@ -0,0 +1,38 @@
+"""search_index
+
+Revision ID: b7e1c4f9a2d6
+Revises: a2b4d6f8c931
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1c4f9a2d6'
+down_revision = 'a2b4d6f8c931'
+branch_labels = None
+depends_on = None
+
+# Índice de busca (search.py): FTS5 no SQLite, tsvector + GIN no Postgres.
+# rowid = id * 4 + origem (1 lead, 2 mensagem de chat, 3 avaliação)
+SOURCES = [
+    (1, 'lead', ['nome', 'email', 'projeto'], ''),
+    (2, 'chat_message', ['conteudo'], "WHERE tipo = 'texto'"),
+    (3, 'review', ['nome', 'empresa', 'avaliacao'], ''),
+]
+
+def upgrade():
+    postgres = op.get_bind().dialect.name == 'postgresql'
+    if postgres:
+        op.execute("CREATE TABLE search_index (id BIGINT PRIMARY KEY, body TEXT NOT NULL, "
+                   "tsv tsvector GENERATED ALWAYS AS (to_tsvector('portuguese', body)) STORED)")
+        op.execute("CREATE INDEX ix_search_index_tsv ON search_index USING gin (tsv)")
+    else:
+        op.execute("CREATE VIRTUAL TABLE search_index USING fts5(body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+    for code, tabela, campos, filtro in SOURCES:
+        corpo = " || ' ' || ".join(f"coalesce({c}, '')" for c in campos)
+        op.execute(f"INSERT INTO search_index ({'id' if postgres else 'rowid'}, body) SELECT id * 4 + {code}, {corpo} FROM {tabela} {filtro}")
+
+def downgrade():
+    op.execute('DROP TABLE search_index')
@@ -0,0 +1,51 @@
+"""chat archive
+
+Revision ID: c3f5a7e9b1d2
+Revises: b7e1c4f9a2d6
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+import json
+import zlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c3f5a7e9b1d2'
+down_revision = 'b7e1c4f9a2d6'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('chat_archive',
+    sa.Column('session_id', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=False),
+    sa.Column('last_id', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.ForeignKeyConstraint(['session_id'], ['chat_session.id'], ),
+    sa.PrimaryKeyConstraint('session_id')
+    )
+    with op.batch_alter_table('chat_session', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('closed_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('archived_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_chat_session_archive', ['status', 'archived_at', 'closed_at'], unique=False)
+
+    # Sessões já encerradas: a última mensagem (ou a abertura) vale como data de encerramento
+    op.execute("UPDATE chat_session SET closed_at = COALESCE((SELECT MAX(data) FROM chat_message WHERE chat_message.session_id = chat_session.id), created_at) "
+               "WHERE status = 'Encerrado'")
+
+def downgrade():
+    # Devolve as mensagens arquivadas à tabela quente (o índice de busca volta com flask rebuild-search)
+    bind = op.get_bind()
+    mensagens = sa.table('chat_message', sa.column('id'), sa.column('session_id'), sa.column('remetente'), sa.column('conteudo'), sa.column('tipo'), sa.column('data'))
+    for session_id, data in bind.execute(sa.text('SELECT session_id, data FROM chat_archive')).all():
+        linhas = [json.loads(l) for l in zlib.decompress(data).decode().splitlines()]
+        bind.execute(mensagens.insert(), [{'id': i, 'session_id': session_id, 'remetente': r, 'conteudo': c, 'tipo': t, 'data': d and datetime.fromisoformat(d)}
+                                         for i, r, c, t, d in linhas])
+    with op.batch_alter_table('chat_session', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_session_archive')
+        batch_op.drop_column('archived_at')
+        batch_op.drop_column('closed_at')
+    op.drop_table('chat_archive')
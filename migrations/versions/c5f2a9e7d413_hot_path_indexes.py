@@ -0,0 +1,34 @@
+"""hot path indexes
+
+Revision ID: c5f2a9e7d413
+Revises: b3e8f05a6c21
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'c5f2a9e7d413'
+down_revision = 'b3e8f05a6c21'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_chat_message_session_id', 'chat_message', ['session_id', 'id']),
+    ('ix_chat_session_user_status', 'chat_session', ['user_id', 'status']),
+    ('ix_chat_session_user_created', 'chat_session', ['user_id', 'created_at', 'id']),
+    ('ix_review_visivel_data_id', 'review', ['visivel', 'data', 'id']),
+    ('ix_review_data_id', 'review', ['data', 'id']),
+    ('ix_lead_data_id', 'lead', ['data', 'id']),
+    ('ix_order_data_id', 'order', ['data', 'id']),
+    ('ix_visit_date', 'visit', ['date']),
+]
+
+def upgrade():
+    for name, table, cols in INDEXES:
+        op.create_index(name, table, cols, unique=False)
+
+def downgrade():
+    for name, table, cols in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,27 @@
+"""review stats
+
+Revision ID: d4a6c8e0f2b3
+Revises: c3f5a7e9b1d2
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd4a6c8e0f2b3'
+down_revision = 'c3f5a7e9b1d2'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('review_stats',
+    sa.Column('stars', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('stars')
+    )
+    op.execute('INSERT INTO review_stats (stars, count) SELECT estrelas, COUNT(*) FROM review '
+               'WHERE visivel = true AND estrelas IS NOT NULL GROUP BY estrelas')
+
+def downgrade():
+    op.drop_table('review_stats')
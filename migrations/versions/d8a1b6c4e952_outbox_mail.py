@@ -0,0 +1,41 @@
+"""outbox_mail
+
+Revision ID: d8a1b6c4e952
+Revises: c5f2a9e7d413
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'd8a1b6c4e952'
+down_revision = 'c5f2a9e7d413'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('outbox_mail',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=True),
+    sa.Column('sender', sa.String(length=100), nullable=True),
+    sa.Column('recipients', sa.Text(), nullable=True),
+    sa.Column('html', sa.Text(), nullable=True),
+    sa.Column('attachments', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+    sa.Column('claim_token', sa.String(length=32), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_outbox_mail_status_next', 'outbox_mail', ['status', 'next_attempt_at'], unique=False)
+    op.create_index(op.f('ix_outbox_mail_claim_token'), 'outbox_mail', ['claim_token'], unique=False)
+
+def downgrade():
+    op.drop_index(op.f('ix_outbox_mail_claim_token'), table_name='outbox_mail')
+    op.drop_index('ix_outbox_mail_status_next', table_name='outbox_mail')
+    op.drop_table('outbox_mail')
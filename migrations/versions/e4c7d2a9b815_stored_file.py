@@ -0,0 +1,27 @@
+"""stored_file
+
+Revision ID: e4c7d2a9b815
+Revises: d8a1b6c4e952
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e4c7d2a9b815'
+down_revision = 'd8a1b6c4e952'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('stored_file',
+    sa.Column('path', sa.String(length=100), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('refcount', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('path')
+    )
+
+def downgrade():
+    op.drop_table('stored_file')
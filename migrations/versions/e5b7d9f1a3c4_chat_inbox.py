@@ -0,0 +1,42 @@
+"""chat inbox
+
+Revision ID: e5b7d9f1a3c4
+Revises: d4a6c8e0f2b3
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'e5b7d9f1a3c4'
+down_revision = 'd4a6c8e0f2b3'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    with op.batch_alter_table('chat_session', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_message_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('last_message_preview', sa.String(length=120), nullable=True))
+        batch_op.add_column(sa.Column('unread_admin', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('unread_client', sa.Integer(), server_default='0', nullable=False))
+
+    # Última mensagem de cada sessão; as arquivadas ficam com a data de encerramento
+    op.execute("UPDATE chat_session SET "
+               "last_message_at = COALESCE((SELECT data FROM chat_message WHERE session_id = chat_session.id ORDER BY id DESC LIMIT 1), closed_at, created_at), "
+               "last_message_preview = (SELECT CASE tipo WHEN 'audio' THEN '[Áudio]' WHEN 'arquivo' THEN '[Arquivo]' ELSE substr(conteudo, 1, 120) END "
+               "FROM chat_message WHERE session_id = chat_session.id ORDER BY id DESC LIMIT 1)")
+
+    with op.batch_alter_table('chat_session', schema=None) as batch_op:
+        batch_op.alter_column('last_message_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_chat_session_activity', ['last_message_at', 'id'], unique=False)
+        batch_op.create_index('ix_chat_session_user_activity', ['user_id', 'last_message_at', 'id'], unique=False)
+
+def downgrade():
+    with op.batch_alter_table('chat_session', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_session_user_activity')
+        batch_op.drop_index('ix_chat_session_activity')
+        batch_op.drop_column('unread_client')
+        batch_op.drop_column('unread_admin')
+        batch_op.drop_column('last_message_preview')
+        batch_op.drop_column('last_message_at')
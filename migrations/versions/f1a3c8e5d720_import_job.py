@@ -0,0 +1,47 @@
+"""import_job
+
+Revision ID: f1a3c8e5d720
+Revises: e4c7d2a9b815
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'f1a3c8e5d720'
+down_revision = 'e4c7d2a9b815'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('import_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('filename', sa.String(length=200), nullable=True),
+    sa.Column('path', sa.String(length=200), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('processed', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('imported', sa.Integer(), nullable=False),
+    sa.Column('failed', sa.Integer(), nullable=False),
+    sa.Column('errors', sa.Text(), nullable=True),
+    sa.Column('last_error', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_import_job_status_created', 'import_job', ['status', 'created_at'], unique=False)
+
+    # A importação faz upsert de ClientStat por (user_id, type, label): remove duplicatas antes da restrição
+    op.execute('DELETE FROM client_stat WHERE id NOT IN (SELECT MAX(id) FROM client_stat GROUP BY user_id, type, label)')
+    with op.batch_alter_table('client_stat', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_client_stat_user_type_label', ['user_id', 'type', 'label'])
+
+def downgrade():
+    with op.batch_alter_table('client_stat', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_client_stat_user_type_label', type_='unique')
+    op.drop_index('ix_import_job_status_created', table_name='import_job')
+    op.drop_table('import_job')
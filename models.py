@@ -6,6 +6,50 @@ import json
 
 db = SQLAlchemy()
 
+# Upserts genéricos usados pelos contadores (rollups, refcount de arquivos) e pela importação
+def _dialect_insert(conn, t):
+    if conn.dialect.name == 'sqlite': from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif conn.dialect.name == 'postgresql': from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else: return None
+    return dialect_insert(t)
+
+def upsert_increment(model, keys, rows, col='count', conn=None):
+    """INSERT ... ON CONFLICT DO UPDATE somando ``col``, em um único executemany.
+
+    ``conn`` padrão é a conexão da transação atual de ``db.session``.
+    """
+    if not rows: return
+    conn = conn if conn is not None else db.session.connection()
+    t = model.__table__
+    stmt = _dialect_insert(conn, t)
+    if stmt is not None:
+        conn.execute(stmt.on_conflict_do_update(index_elements=keys, set_={col: t.c[col] + stmt.excluded[col]}), rows)
+        return
+    for r in rows:
+        res = conn.execute(t.update().where(*[t.c[k] == r[k] for k in keys]).values({col: t.c[col] + r[col]}))
+        if not res.rowcount: conn.execute(t.insert().values(**r))
+
+def upsert(model, keys, rows, conn=None):
+    """INSERT ... ON CONFLICT DO UPDATE sobrescrevendo as demais colunas das linhas, em um único executemany.
+
+    Todas as linhas devem ter as mesmas colunas; sem colunas além de ``keys`` vira DO NOTHING.
+    """
+    if not rows: return
+    conn = conn if conn is not None else db.session.connection()
+    t = model.__table__
+    cols = [c for c in rows[0] if c not in keys]
+    stmt = _dialect_insert(conn, t)
+    if stmt is not None:
+        if cols: stmt = stmt.on_conflict_do_update(index_elements=keys, set_={c: stmt.excluded[c] for c in cols})
+        else: stmt = stmt.on_conflict_do_nothing(index_elements=keys)
+        conn.execute(stmt, rows)
+        return
+    for r in rows:
+        onde = [t.c[k] == r[k] for k in keys]
+        if cols and conn.execute(t.update().where(*onde).values({c: r[c] for c in cols})).rowcount: continue
+        if not cols and conn.execute(t.select().where(*onde)).first(): continue
+        conn.execute(t.insert().values(**r))
+
 # Tabela de Usuários (Clientes e Admins)
 class User(db.Model, UserMixin): 
     id = db.Column(db.Integer, primary_key=True)
@@ -37,18 +81,52 @@ class ClientPlan(db.Model):
 
 # Estatísticas do Gráfico do Cliente
 class ClientStat(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'type', 'label', name='uq_client_stat_user_type_label'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     label = db.Column(db.String(50))
     value = db.Column(db.Float)
     type = db.Column(db.String(20))
 
+# Séries temporais do cliente (ver timeseries.py): um ponto por (métrica, instante)
+class ClientMetric(db.Model):
+    __table_args__ = (db.UniqueConstraint('user_id', 'metric', 'ts', name='uq_client_metric_user_metric_ts'),) # também serve às consultas por intervalo
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    metric = db.Column(db.String(30), nullable=False)
+    ts = db.Column(db.DateTime, nullable=False)
+    value = db.Column(db.Float, nullable=False)
+
+# Agregados mensais de ClientMetric, recalculados a cada gravação
+class ClientMetricMonthly(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    metric = db.Column(db.String(30), primary_key=True)
+    month = db.Column(db.String(7), primary_key=True) # 'AAAA-MM'
+    count = db.Column(db.Integer, nullable=False, default=0)
+    total = db.Column(db.Float, nullable=False, default=0)
+    min = db.Column(db.Float)
+    max = db.Column(db.Float)
+
 class Visit(db.Model):
+    __table_args__ = (db.Index('ix_visit_date', 'date'),)
     id = db.Column(db.Integer, primary_key=True)
     page = db.Column(db.String(50))
     date = db.Column(db.DateTime, default=datetime.utcnow)
 
+# Contagem diária de visitas por página (alimentada em lote pelo VisitRecorder)
+class VisitDaily(db.Model):
+    page = db.Column(db.String(50), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+# Contadores diários do dashboard: visits, leads, orders, reviews, chats
+class DailyStat(db.Model):
+    metric = db.Column(db.String(20), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 class Lead(db.Model):
+    __table_args__ = (db.Index('ix_lead_data_id', 'data', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100))
     email = db.Column(db.String(100))
@@ -57,6 +135,7 @@ class Lead(db.Model):
     data = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Order(db.Model):
+    __table_args__ = (db.Index('ix_order_data_id', 'data', 'id'),)
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     plano = db.Column(db.String(50))
     preco = db.Column(db.String(20))
@@ -65,6 +144,10 @@ class Order(db.Model):
     data = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Review(db.Model):
+    __table_args__ = (
+        db.Index('ix_review_visivel_data_id', 'visivel', 'data', 'id'),
+        db.Index('ix_review_data_id', 'data', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     nome = db.Column(db.String(100))
     empresa = db.Column(db.String(100))
@@ -74,7 +157,19 @@ class Review(db.Model):
     data = db.Column(db.DateTime, default=datetime.utcnow)
     visivel = db.Column(db.Boolean, default=True)
 
+# Histograma das avaliações visíveis por número de estrelas (ver analytics.review_summary)
+class ReviewStats(db.Model):
+    stars = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
 class ChatSession(db.Model):
+    __table_args__ = (
+        db.Index('ix_chat_session_user_status', 'user_id', 'status'),
+        db.Index('ix_chat_session_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_chat_session_archive', 'status', 'archived_at', 'closed_at'),
+        db.Index('ix_chat_session_activity', 'last_message_at', 'id'),
+        db.Index('ix_chat_session_user_activity', 'user_id', 'last_message_at', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     session_uuid = db.Column(db.String(50), unique=True)
     category = db.Column(db.String(50))
@@ -83,8 +178,16 @@ class ChatSession(db.Model):
     client_phone = db.Column(db.String(30))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    closed_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime) # mensagens movidas para ChatArchive
+    # Caixa de entrada do painel (ver chat_inbox.py)
+    last_message_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_message_preview = db.Column(db.String(120))
+    unread_admin = db.Column(db.Integer, default=0, nullable=False) # do visitante/cliente, ainda não lidas pelo atendimento
+    unread_client = db.Column(db.Integer, default=0, nullable=False) # do atendimento, ainda não lidas pelo visitante/cliente
 
 class ChatMessage(db.Model):
+    __table_args__ = (db.Index('ix_chat_message_session_id', 'session_id', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('chat_session.id'))
     tipo = db.Column(db.String(20))
@@ -92,6 +195,13 @@ class ChatMessage(db.Model):
     remetente = db.Column(db.String(20))
     data = db.Column(db.DateTime, default=datetime.utcnow)
 
+# Histórico das sessões encerradas há tempo, fora da tabela quente (ver chat_archive.py)
+class ChatArchive(db.Model):
+    session_id = db.Column(db.Integer, db.ForeignKey('chat_session.id'), primary_key=True)
+    message_count = db.Column(db.Integer, nullable=False)
+    last_id = db.Column(db.Integer, nullable=False) # maior id de mensagem arquivado
+    data = db.Column(db.LargeBinary, nullable=False) # JSONL comprimido (zlib), uma mensagem por linha
+
 class PortfolioItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100))
@@ -101,4 +211,54 @@ class PortfolioItem(db.Model):
 class SiteConfig(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(50), unique=True)
-    value = db.Column(db.Text)
\ No newline at end of file
+    value = db.Column(db.Text)
+
+# Fila de e-mails de saída (ver mailer.MailQueue)
+class OutboxMail(db.Model):
+    __table_args__ = (db.Index('ix_outbox_mail_status_next', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200))
+    sender = db.Column(db.String(100))
+    recipients = db.Column(db.Text) # Lista JSON
+    html = db.Column(db.Text)
+    attachments = db.Column(db.Text) # Lista JSON de {filename, content_type, path}
+    status = db.Column(db.String(20), default='pendente', nullable=False) # pendente, enviando, enviado, falhou
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claim_token = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+# Arquivos enviados, endereçados pelo conteúdo (ver uploads.UploadStore)
+class StoredFile(db.Model):
+    path = db.Column(db.String(100), primary_key=True) # ab/cd/<sha256>.<ext>
+    size = db.Column(db.Integer)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Importações em lote por CSV (ver imports.ImportQueue)
+class ImportJob(db.Model):
+    __table_args__ = (db.Index('ix_import_job_status_created', 'status', 'created_at'),)
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    kind = db.Column(db.String(20), nullable=False) # clients, stats, leads
+    filename = db.Column(db.String(200))
+    path = db.Column(db.String(200), nullable=False) # arquivo em IMPORT_FOLDER
+    size = db.Column(db.Integer, default=0)
+    status = db.Column(db.String(20), default='pendente', nullable=False) # pendente, processando, concluido, falhou
+    processed = db.Column(db.Integer, default=0, nullable=False) # linhas lidas (checkpoint para retomar)
+    position = db.Column(db.Integer, default=0, nullable=False) # bytes lidos, para o progresso
+    imported = db.Column(db.Integer, default=0, nullable=False)
+    failed = db.Column(db.Integer, default=0, nullable=False)
+    errors = db.Column(db.Text) # Lista JSON de {linha, erro}, limitada a IMPORT_MAX_ERRORS
+    last_error = db.Column(db.String(500))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    claimed_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {'id': self.id, 'kind': self.kind, 'filename': self.filename, 'status': self.status,
+                'processed': self.processed, 'imported': self.imported, 'failed': self.failed,
+                'progress': round(100 * self.position / self.size) if self.size else (100 if self.status == 'concluido' else 0),
+                'errors': json.loads(self.errors or '[]'), 'last_error': self.last_error}
@@ -0,0 +1,103 @@
+"""Cache das páginas públicas renderizadas, invalidado por versão de conteúdo.
+
+A versão é o conteúdo de um arquivo local (``instance/site_version``, um uuid
+novo a cada troca), então todos os workers do gunicorn enxergam a mesma com uma
+leitura pequena por request; o mtime não serve, porque em sistemas de arquivos
+com resolução grossa duas trocas no mesmo instante teriam a mesma versão. Qualquer
+commit que insira, altere ou remova ``PublicPlan``, ``PortfolioItem``,
+``SiteConfig`` ou ``Review`` (a nota média aparece na home) troca o arquivo;
+cada worker re-renderiza na próxima visita. A mesma versão vira o ETag, e o
+navegador revalida com 304.
+"""
+import json
+import os
+import threading
+import uuid
+import zlib
+
+from flask import current_app, has_app_context, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import PublicPlan, PortfolioItem, SiteConfig, Review
+
+TRACKED = (PublicPlan, PortfolioItem, SiteConfig, Review)
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_content(session, flush_context):
+    for objs in (session.new, session.dirty, session.deleted):
+        if any(isinstance(o, TRACKED) for o in objs):
+            session.info['page_cache_dirty'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    # só depois do commit: antes disso outro worker re-renderizaria o conteúdo antigo
+    if session.info.pop('page_cache_dirty', False) and has_app_context():
+        cache = current_app.extensions.get('page_cache')
+        if cache: cache.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('page_cache_dirty', None)
+
+
+class PageCache:
+    def __init__(self, app=None):
+        self._pages = {} # chave -> (versão, html)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('PAGE_CACHE_VERSION_FILE') or os.path.join(app.instance_path, 'site_version')
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if not os.path.exists(self.path): self.bump()
+        pasta = os.path.join(app.root_path, app.template_folder)
+        self._templates = format(max((e.stat().st_mtime_ns for e in os.scandir(pasta) if e.is_file()), default=0), 'x')
+        app.extensions['page_cache'] = self
+
+    @property
+    def build(self):
+        """Parte do ETag que muda a cada deploy: templates e manifesto dos assets.
+
+        O HTML aponta para ``script.<hash>.js``; um deploy só de CSS/JS apaga os
+        arquivos antigos, então o navegador não pode ganhar 304 para a página velha.
+        """
+        assets = current_app.extensions.get('assets')
+        manifest = json.dumps(assets.manifest, sort_keys=True).encode() if assets else b''
+        return f"{self._templates}{zlib.crc32(manifest):08x}"
+
+    def version(self):
+        try:
+            with open(self.path) as fp: return fp.read().strip() or '0'
+        except FileNotFoundError: return '0'
+
+    def bump(self):
+        """Troca o arquivo de versão (escrita atômica); vale para todos os workers."""
+        tmp = f"{self.path}.{uuid.uuid4().hex}"
+        with open(tmp, 'w') as fp: fp.write(uuid.uuid4().hex)
+        os.replace(tmp, self.path)
+
+    def get(self, key, render):
+        """(html, etag) da página ``key``; chama ``render()`` só quando a versão mudou."""
+        versao = f"{self.version()}-{self.build}" # lida antes de renderizar: um bump no meio invalida de novo
+        atual = self._pages.get(key)
+        if atual is None or atual[0] != versao:
+            atual = (versao, render())
+            with self._lock: self._pages[key] = atual
+        return atual[1], f"{key}-{versao}"
+
+    def response(self, key, render):
+        """Resposta com ETag; 304 quando o navegador já tem a versão atual."""
+        html, etag = self.get(key, render)
+        resp = make_response(html)
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp.make_conditional(request)
+
+    def clear(self):
+        with self._lock: self._pages.clear()
@@ -0,0 +1,227 @@
+"""Orçamento de consultas SQL por rota, medido num banco SQLite semeado.
+
+Cada entrada de BUDGETS faz um request à rota (anônimo, admin ou cliente) e
+conta os comandos SQL executados, inclusive os de respostas em stream. Rota
+acima do orçamento é reportada com as consultas que executou, o que deixa um
+N+1 visível: o seed cria dezenas de clientes, sessões e mensagens, então uma
+consulta por linha estoura o limite na hora. Rota que responde 4xx/5xx também
+falha, qualquer que seja a contagem.
+
+No mesmo banco roda também a verificação de planos das consultas quentes
+(query_check.py, a mesma do ``flask check-query-plans``): consulta nova com
+varredura completa ou ordenação temporária faz o comando falhar junto.
+
+Roda num banco temporário, sem tocar no banco configurado:
+
+    python -m query_budget        # sai com erro se alguma rota estourar ou algum plano regredir
+    python -m query_budget -v     # lista as consultas de todas as rotas e os planos
+"""
+import io
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+SEED_CLIENTS = 30
+SEED_SESSIONS = 20
+SEED_MESSAGES = 8
+
+# (rota, quem, método, url, máximo de consultas, kwargs do request)
+# A url é formatada com os ids do seed. Rotas que apagam ficam no fim.
+# O user_loader tem cache (user_cache.py): só o primeiro request de cada cliente,
+# ou o primeiro depois de uma mudança em User, consulta o usuário. 'login' é um
+# navegador à parte, que entra e sai sem mexer nas sessões dos outros.
+# Ficam de fora só as rotas de arquivo, que não tocam no banco: static, asset
+# (assets.Assets) e uploaded_file.
+BUDGETS = [
+    ('index', 'anon', 'GET', '/', 4, {}),
+    ('index (cache)', 'anon', 'GET', '/', 0, {}),
+    ('termos', 'anon', 'GET', '/termos-e-privacidade', 0, {}),
+    ('admin_login (form)', 'anon', 'GET', '/admin/login', 0, {}),
+    ('client_login (form)', 'anon', 'GET', '/cliente/login', 0, {}),
+    ('client_login', 'login', 'POST', '/cliente/login', 1, {'data': {'username': '{client_username}', 'password': 'senha'}}),
+    ('logout', 'login', 'GET', '/logout', 1, {}),
+    ('admin_login', 'login', 'POST', '/admin/login', 1, {'data': {'username': 'admin', 'password': 'senha'}}),
+    ('upload_link', 'anon', 'GET', '/arquivo/{upload_token}', 0, {}),
+    ('reviews', 'anon', 'GET', '/avaliacoes', 2, {}),
+    ('reviews_page', 'anon', 'GET', '/avaliacoes/mais?cursor={review_cursor}', 1, {}),
+    ('submit_lead', 'anon', 'POST', '/submit_lead', 4, {'data': {'nome': 'Lead', 'email': 'l@x.com', 'telefone': '1', 'projeto': 'p'}}),
+    ('submit_review', 'anon', 'POST', '/submit_review', 4, {'json': {'nome': 'R', 'avaliacao': 'ok', 'estrelas': 5}}),
+    ('init_session', 'anon', 'POST', '/init_session', 7, {'json': {'name': 'Visitante', 'category': 'Geral'}}),
+    ('send_chat', 'anon', 'POST', '/send_chat', 5, {'data': {'session_id': '{public_uuid}', 'message': 'oi', 'remetente': 'user'}}),
+    ('get_messages', 'anon', 'GET', '/get_messages/{public_uuid}', 2, {}),
+    ('get_messages (cursor)', 'anon', 'GET', '/get_messages/{public_uuid}?after_id={public_last}', 2, {}),
+    ('get_messages (arquivada)', 'anon', 'GET', '/get_messages/{archived_uuid}', 3, {}),
+    ('chat_stream', 'anon', 'GET', '/chat_stream/{public_uuid}', 2, {}),
+    ('mark_chat_read', 'anon', 'POST', '/chat/{public_uuid}/read', 1, {}),
+    ('admin', 'admin', 'GET', '/admin', 3, {}),
+    ('metrics', 'admin', 'GET', '/metrics', 0, {}),
+    ('admin aba planos', 'admin', 'GET', '/admin/tab/plans', 1, {}),
+    ('admin aba cases', 'admin', 'GET', '/admin/tab/cases', 1, {}),
+    ('admin aba clientes', 'admin', 'GET', '/admin/tab/clients', 1, {}),
+    ('admin aba leads', 'admin', 'GET', '/admin/tab/leads', 1, {}),
+    ('admin aba chat do site', 'admin', 'GET', '/admin/tab/chat_public', 1, {}),
+    ('admin aba chat de clientes', 'admin', 'GET', '/admin/tab/chat_client', 1, {}),
+    ('admin aba avaliações', 'admin', 'GET', '/admin/tab/reviews', 1, {}),
+    ('admin aba vendas', 'admin', 'GET', '/admin/tab/orders', 1, {}),
+    ('admin_search', 'admin', 'GET', '/admin/search?q=lead', 3, {}),
+    ('admin_search (tipo)', 'admin', 'GET', '/admin/search?q=mensagem&kind=chat&page=2', 3, {}),
+    ('export leads csv', 'admin', 'GET', '/admin/export/leads.csv', 1, {}),
+    ('export chats xlsx', 'admin', 'GET', '/admin/export/chats.xlsx?inicio=2020-01-01', 2, {}),
+    ('update_plan', 'admin', 'POST', '/admin/update_plan/{plan_id}', 2, {'data': {'name': 'P', 'price': '1', 'old_price': '2', 'benefits': 'a,b'}}),
+    ('create_client', 'admin', 'POST', '/admin/create_client', 5, {'data': {'username': 'novo', 'password': 'x', 'name': 'Novo', 'plan_name': 'Start'}}),
+    ('update_client_stats', 'admin', 'POST', '/admin/update_client_stats/{client_id}', 5, {'data': {'labels[]': ['Jan', 'Fev'], 'values[]': ['1', '2'], 'plan_name': 'P', 'benefits': 'a'}}),
+    ('admin_import', 'admin', 'POST', '/admin/import', 8, {'data': {'kind': 'stats', 'file': (io.BytesIO(b'username,label,value\ncliente1,Jan,1\ncliente2,Jan,2\nfantasma,Jan,3\n'), 'm.csv')}}),
+    ('admin_import_status', 'admin', 'GET', '/admin/import/{import_id}', 1, {}),
+    ('admin_import_errors', 'admin', 'GET', '/admin/import/{import_id}/errors.csv', 1, {}),
+    ('create_case', 'admin', 'POST', '/admin/create_case', 2, {'data': {'title': 'Case', 'description': 'd', 'image_file': (io.BytesIO(b'\x89PNG imagem'), 'case.png')}}),
+    ('toggle_review', 'admin', 'GET', '/admin/toggle_review/{review_id}', 3, {}),
+    ('cliente', 'client', 'GET', '/cliente', 5, {}),
+    ('client_metrics', 'client', 'GET', '/client/metrics?metric=visitas&points=200', 2, {}),
+    ('client_metrics_monthly', 'client', 'GET', '/client/metrics/monthly?metric=visitas', 1, {}),
+    ('client_send_message', 'client', 'POST', '/client/send_message', 5, {'data': {'message': 'oi'}}),
+    ('client_get_chat', 'client', 'GET', '/client/get_chat', 2, {}),
+    ('client_chat_stream', 'client', 'GET', '/client/chat_stream', 2, {}),
+    ('mark_chat_read (admin)', 'admin', 'POST', '/chat/{public_uuid}/read', 1, {}),
+    ('close_ticket', 'admin', 'POST', '/close_ticket/{public_uuid}', 3, {}),
+    ('delete_review', 'admin', 'GET', '/admin/delete_review/{review_id}', 5, {}),
+    ('delete_case', 'admin', 'GET', '/admin/delete_case/{case_id}', 2, {}),
+    ('delete_client', 'admin', 'GET', '/admin/delete_client/{other_client_id}', 1, {}),
+    ('configurar_site', 'anon', 'GET', '/configurar-site', 3, {}), # troca a senha do admin: por último
+]
+
+
+def seed():
+    """Popula o banco atual e devolve os ids usados nas urls de BUDGETS."""
+    from flask import current_app
+    from werkzeug.datastructures import FileStorage
+    from werkzeug.security import generate_password_hash
+    from models import db, User, ClientPlan, ClientStat, PublicPlan, PortfolioItem, SiteConfig, Lead, Order, Review, ChatSession, ChatMessage, ImportJob
+    from uploads import sign_upload
+    from analytics import rebuild_rollups
+    from timeseries import record
+    import chat_archive
+
+    senha = generate_password_hash('senha')
+    agora = datetime.now()
+    db.session.add(User(username='admin', name='Admin', role='admin', password_hash=senha))
+    clientes = [User(username=f'cliente{i}', name=f'Cliente {i}', role='client', password_hash=senha) for i in range(SEED_CLIENTS)]
+    db.session.add_all(clientes)
+    db.session.flush()
+    for u in clientes:
+        db.session.add(ClientPlan(user_id=u.id, plan_name='Growth', benefits='["Suporte"]'))
+        db.session.add_all(ClientStat(user_id=u.id, label=f'Mês {m}', value=m * 10, type='growth') for m in range(1, 7))
+    planos = [PublicPlan(name=n, price='1.000', old_price='2.000', benefits='["a", "b"]', order_index=i) for i, n in enumerate(('Starter', 'Growth', 'Performance'))]
+    cases = [PortfolioItem(title=f'Case {i}', description='d', image_url='https://images.unsplash.com/x') for i in range(6)]
+    db.session.add_all(planos + cases)
+    db.session.add(SiteConfig(key='about_text', value='Sobre nós'))
+    for i in range(60):
+        quando = agora - timedelta(hours=i * 7)
+        db.session.add(Lead(nome=f'Lead {i}', email=f'l{i}@x.com', telefone='1', projeto='p', data=quando))
+        db.session.add(Order(plano='Growth', preco='3.200', metodo='pix', data=quando))
+        db.session.add(Review(nome=f'R {i}', avaliacao='bom', estrelas=5, visivel=i % 3 != 0, data=quando))
+    sessoes = []
+    for i in range(SEED_SESSIONS):
+        dono = clientes[i] if i % 2 else None # metade do site, metade de clientes
+        s = ChatSession(session_uuid=f'sessao{i:04d}', category='Geral', client_name=f'Visitante {i}', status='Aberto',
+                        user_id=dono.id if dono else None, created_at=agora - timedelta(hours=i))
+        sessoes.append(s)
+    db.session.add_all(sessoes)
+    db.session.flush()
+    for s in sessoes:
+        db.session.add_all(ChatMessage(session_id=s.id, tipo='texto', conteudo=f'mensagem {m}', remetente='user' if m % 2 else 'admin',
+                                       data=s.created_at + timedelta(minutes=m)) for m in range(SEED_MESSAGES))
+    arquivada = sessoes[2]
+    arquivada.status, arquivada.closed_at = 'Encerrado', agora - timedelta(days=400)
+    anexo, _ = current_app.extensions['upload_store'].save(FileStorage(io.BytesIO(b'proposta'), 'proposta.pdf'), 'pdf')
+    job = ImportJob(kind='leads', filename='leads.csv', path='leads.csv', status='concluido', processed=3, imported=1, failed=2,
+                    errors='[{"linha": 2, "erro": "email vazio"}, {"linha": 3, "erro": "nome vazio"}]', finished_at=agora)
+    db.session.add(job)
+    record([{'user_id': clientes[1].id, 'metric': 'visitas', 'ts': agora - timedelta(days=d), 'value': d % 50} for d in range(1, 800)])
+    db.session.commit()
+    rebuild_rollups()
+    chat_archive.archive(days=365)
+    publica = sessoes[0]
+    meio = Review.query.filter_by(visivel=True).order_by(Review.data.desc(), Review.id.desc()).offset(12).first()
+    return {
+        'public_uuid': publica.session_uuid, 'archived_uuid': arquivada.session_uuid,
+        'public_last': db.session.query(db.func.max(ChatMessage.id)).filter(ChatMessage.session_id == publica.id).scalar() - 2,
+        'review_cursor': f'{meio.data.isoformat()}|{meio.id}',
+        'plan_id': planos[0].id, 'case_id': cases[0].id, 'review_id': 1,
+        'client_id': clientes[1].id, 'client_username': clientes[1].username,
+        'other_client_id': clientes[-2].id,
+        'upload_token': sign_upload(anexo, 'proposta.pdf'), 'import_id': job.id,
+    }
+
+
+@contextmanager
+def count_queries(engine):
+    """Coleta os comandos SQL executados no bloco."""
+    from sqlalchemy import event
+    consultas = []
+    def registrar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(' '.join(statement.split()))
+    event.listen(engine, 'before_cursor_execute', registrar)
+    try: yield consultas
+    finally: event.remove(engine, 'before_cursor_execute', registrar)
+
+
+def run_budgets(app, budgets=BUDGETS, ids=None):
+    """Executa cada rota e devolve [(rota, consultas, orçamento, status)]."""
+    from models import db
+    app.config.update(WTF_CSRF_ENABLED=False, CHAT_STREAM_TIMEOUT=0)
+    with app.app_context():
+        ids = ids or seed()
+        engine = db.engine
+    # requests fora do app context acima: cada um ganha g e sessão próprios, como em produção
+    clientes = {quem: app.test_client() for quem in ('anon', 'admin', 'client', 'login')}
+    clientes['admin'].post('/admin/login', data={'username': 'admin', 'password': 'senha'})
+    clientes['client'].post('/cliente/login', data={'username': ids['client_username'], 'password': 'senha'})
+    resultado = []
+    for rota, quem, metodo, url, maximo, kwargs in budgets:
+        kwargs = {k: ({c: (v.format(**ids) if isinstance(v, str) else v) for c, v in d.items()} if k == 'data' else d) for k, d in kwargs.items()}
+        with count_queries(engine) as consultas:
+            resp = clientes[quem].open(url.format(**ids), method=metodo, **kwargs)
+            resp.get_data() # respostas em stream consultam o banco enquanto são lidas
+            resp.close()
+        resultado.append((rota, consultas, maximo, resp.status_code))
+    return resultado
+
+
+def main(argv=sys.argv[1:]):
+    verbose = '-v' in argv
+    pasta = tempfile.mkdtemp(prefix='query-budget-')
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(pasta, 'budget.db')}", MAIL_WORKERS='0', IMPORT_WORKERS='0',
+                      IMPORT_FOLDER=os.path.join(pasta, 'imports'), UPLOAD_FOLDER=os.path.join(pasta, 'uploads'),
+                      CHAT_EVENTS_DB=os.path.join(pasta, 'chat_events.db'), METRICS_DIR=os.path.join(pasta, 'metrics'),
+                      PAGE_CACHE_VERSION_FILE=os.path.join(pasta, 'site_version'), USER_CACHE_VERSION_FILE=os.path.join(pasta, 'users_version'))
+    from app import app, limiter
+    from models import db
+    from query_check import check_query_plans
+    limiter.enabled = False
+    with app.app_context():
+        db.create_all()
+    falhas = 0
+    for rota, consultas, maximo, status in run_budgets(app):
+        estourou = len(consultas) > maximo
+        erro = not 200 <= status < 400
+        falhas += estourou or erro
+        print(f"{'FALHA' if estourou or erro else 'ok':5} {rota:28} {len(consultas):3}/{maximo:<3} HTTP {status}")
+        if estourou or verbose:
+            for c in consultas: print(f"        {c[:200]}")
+    print(f"{falhas} rota(s) acima do orçamento ou com erro HTTP." if falhas else "Todas as rotas dentro do orçamento.")
+    with app.app_context():
+        planos = check_query_plans()
+    ruins = 0
+    for nome, (plano, problemas) in planos.items():
+        ruins += bool(problemas)
+        if problemas or verbose:
+            print(f"{'FALHA' if problemas else 'ok':5} plano: {nome}")
+            for linha in plano: print(f"      {'!' if linha in problemas else ' '} {linha}")
+    print(f"{ruins} consulta(s) quente(s) sem índice adequado." if ruins else f"Planos das {len(planos)} consultas quentes ok.")
+    return 1 if falhas or ruins else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
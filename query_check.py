@@ -0,0 +1,81 @@
+"""Verificação dos planos de consulta dos caminhos quentes (EXPLAIN QUERY PLAN no SQLite).
+
+Cada entrada de HOT_QUERIES reproduz a consulta feita por uma rota. Um plano com
+varredura completa de tabela (``SCAN tabela`` sem índice) ou ordenação em tabela
+temporária é reportado como problema; ``flask check-query-plans`` sai com erro
+nesses casos, para uma consulta lenta nova ser pega antes do deploy. O
+``python -m query_budget`` roda a mesma verificação no banco que ele semeia, então
+não depende de alguém lembrar do comando.
+``time_queries`` mede as mesmas consultas no banco atual (útil depois do
+``flask generate-data``).
+"""
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select, tuple_, literal
+
+from models import db, ChatSession, ChatMessage, ChatArchive, Review, Lead, Order, Visit, DailyStat, ClientMetric, ClientMetricMonthly
+
+_AGORA = datetime(2026, 1, 1)
+
+HOT_QUERIES = {
+    'get_messages (sessão por uuid)': lambda: select(ChatSession.id, ChatSession.status, func.coalesce(select(func.max(ChatMessage.id)).where(ChatMessage.session_id == ChatSession.id).scalar_subquery(), ChatArchive.last_id))
+        .outerjoin(ChatArchive, ChatArchive.session_id == ChatSession.id).where(ChatSession.session_uuid == 'x'),
+    'client_get_chat (sessão aberta do cliente)': lambda: select(ChatSession.id, ChatSession.status).where(ChatSession.user_id == 1, ChatSession.status == 'Aberto'),
+    'get_messages (mensagens depois do cursor)': lambda: select(ChatMessage).where(ChatMessage.session_id == 1, ChatMessage.id > 0).order_by(ChatMessage.id),
+    'reviews (visíveis por data)': lambda: select(Review).where(Review.visivel == True).order_by(Review.data.desc(), Review.id.desc()).limit(20),
+    'admin leads (intervalo de datas)': lambda: select(Lead).where(Lead.data >= _AGORA - timedelta(days=7)),
+    'admin aba leads (keyset)': lambda: select(Lead).where(tuple_(Lead.data, Lead.id) < tuple_(literal(_AGORA), literal(10))).order_by(Lead.data.desc(), Lead.id.desc()).limit(50),
+    'admin aba vendas': lambda: select(Order).order_by(Order.data.desc(), Order.id.desc()).limit(50),
+    'admin aba avaliações': lambda: select(Review).order_by(Review.data.desc(), Review.id.desc()).limit(50),
+    'archive-chats (encerradas a arquivar)': lambda: select(ChatSession.id).where(ChatSession.status == 'Encerrado', ChatSession.archived_at == None, ChatSession.closed_at < _AGORA).order_by(ChatSession.closed_at).limit(200),
+    'admin aba chat do site (caixa de entrada)': lambda: select(ChatSession).where(ChatSession.user_id == None).order_by(ChatSession.last_message_at.desc(), ChatSession.id.desc()).limit(50),
+    'admin aba chat de clientes (caixa de entrada)': lambda: select(ChatSession).where(ChatSession.user_id != None, tuple_(ChatSession.last_message_at, ChatSession.id) < tuple_(literal(_AGORA), literal(10)))
+        .order_by(ChatSession.last_message_at.desc(), ChatSession.id.desc()).limit(50),
+    'visitas (contagem por período)': lambda: select(func.count()).select_from(Visit).where(Visit.date >= _AGORA),
+    'cliente (série temporal por intervalo)': lambda: select(ClientMetric.ts, ClientMetric.value).where(ClientMetric.user_id == 1, ClientMetric.metric == 'visitas', ClientMetric.ts >= _AGORA - timedelta(days=365), ClientMetric.ts < _AGORA).order_by(ClientMetric.ts),
+    'cliente (agregados mensais)': lambda: select(ClientMetricMonthly).where(ClientMetricMonthly.user_id == 1, ClientMetricMonthly.metric == 'visitas').order_by(ClientMetricMonthly.month),
+    'dashboard (série diária)': lambda: select(DailyStat.day, DailyStat.count).where(DailyStat.metric == 'leads', DailyStat.day >= date(2026, 1, 1)),
+}
+
+_FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+$')
+
+
+def explain(stmt):
+    """Linhas do EXPLAIN QUERY PLAN de ``stmt`` no banco atual."""
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[k] for k in compiled.positiontup) if compiled.positional else compiled.params
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)]
+
+
+def plan_problems(plan):
+    return [linha for linha in plan if _FULL_SCAN.match(linha.strip()) or 'USE TEMP B-TREE' in linha]
+
+
+def check_query_plans(queries=HOT_QUERIES):
+    """Devolve {nome: (plano, problemas)} para cada consulta quente."""
+    if db.engine.dialect.name != 'sqlite':
+        raise RuntimeError('A verificação de planos usa EXPLAIN QUERY PLAN e só roda no SQLite.')
+    resultado = {}
+    for nome, build in queries.items():
+        plano = explain(build())
+        resultado[nome] = (plano, plan_problems(plano))
+    return resultado
+
+
+def time_queries(queries=HOT_QUERIES, repeat=5):
+    """Executa cada consulta quente ``repeat`` vezes; devolve {nome: (linhas, melhor ms, mediana ms)}."""
+    resultado = {}
+    for nome, build in queries.items():
+        stmt = build()
+        tempos = []
+        for _ in range(repeat):
+            inicio = time.perf_counter()
+            linhas = len(db.session.execute(stmt).all())
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        db.session.rollback()
+        tempos.sort()
+        resultado[nome] = (linhas, tempos[0], tempos[len(tempos) // 2])
+    return resultado
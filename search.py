@@ -0,0 +1,207 @@
+"""Busca textual do painel sobre leads, mensagens de chat e avaliações.
+
+Um índice invertido único, ``search_index``, com uma linha por documento:
+
+* SQLite: tabela virtual FTS5 (tokenizer unicode61 sem acentos, índice de
+  prefixos de 2 e 3 letras), ranking bm25;
+* Postgres: coluna ``tsvector`` gerada (configuração 'portuguese') com índice
+  GIN, ranking ``ts_rank_cd``.
+
+O rowid codifica a origem, ``id * 4 + código``, então o resultado volta à
+linha original sem coluna extra e remover/reindexar é por chave primária. O
+código 0 é de sessão arquivada (chat_archive.py): ``session_id * 4``, com o
+texto de todas as mensagens dela, e aparece como resultado do tipo 'chat'. Um
+listener de ``after_flush`` mantém o índice na mesma transação de quem grava
+(submit_lead, send_chat, submit_review, exclusões...); ``rebuild`` recria tudo
+a partir das tabelas (``flask rebuild-search``). Entradas cujo documento sumiu
+por DELETE em massa são descartadas na hora de montar os resultados.
+"""
+import re
+
+from markupsafe import escape
+from sqlalchemy import bindparam, column, event, func, insert, inspect, select, table, text
+from sqlalchemy.orm import Session
+
+from models import db, Lead, ChatMessage, ChatSession, Review
+
+# tipo -> (modelo, código no rowid, campos indexados, filtro de linhas indexáveis)
+SOURCES = {
+    'lead': (Lead, 1, ('nome', 'email', 'projeto'), None),
+    'chat': (ChatMessage, 2, ('conteudo',), lambda: ChatMessage.tipo == 'texto'), # áudio e arquivo guardam só a URL
+    'review': (Review, 3, ('nome', 'empresa', 'avaliacao'), None),
+}
+_BY_MODEL = {model: (kind, code, campos) for kind, (model, code, campos, _) in SOURCES.items()}
+ARCHIVE_CODE = 0 # sessão de chat arquivada: um documento por sessão
+_KINDS = {ARCHIVE_CODE: 'arquivo', **{code: kind for kind, (_, code, _, _) in SOURCES.items()}}
+_MARK = ('\x02', '\x03') # marcadores do trecho destacado, trocados por <mark> depois do escape
+RANK_LIMIT = 20000
+
+_SQLITE_DDL = ["CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(body, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"]
+_POSTGRES_DDL = [
+    "CREATE TABLE IF NOT EXISTS search_index (id BIGINT PRIMARY KEY, body TEXT NOT NULL, "
+    "tsv tsvector GENERATED ALWAYS AS (to_tsvector('portuguese', body)) STORED)",
+    "CREATE INDEX IF NOT EXISTS ix_search_index_tsv ON search_index USING gin (tsv)",
+]
+
+
+def create_index(conn):
+    for ddl in (_POSTGRES_DDL if conn.dialect.name == 'postgresql' else _SQLITE_DDL):
+        conn.execute(text(ddl))
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """Filtro do autogenerate do Alembic: o índice (e as tabelas internas do FTS5) fica fora dos modelos."""
+    return not (type_ == 'table' and name.startswith('search_index'))
+
+
+# db.create_all() (benchmark, query_budget) também cria o índice
+@event.listens_for(db.metadata, 'after_create')
+def _create_with_metadata(target, connection, **kw):
+    create_index(connection)
+
+
+@event.listens_for(db.metadata, 'before_drop')
+def _drop_with_metadata(target, connection, **kw):
+    connection.execute(text('DROP TABLE IF EXISTS search_index'))
+
+
+def _body(obj, campos):
+    return ' '.join(getattr(obj, c) or '' for c in campos)
+
+
+def _indexable(obj):
+    fonte = _BY_MODEL.get(type(obj))
+    return fonte if fonte and not (fonte[0] == 'chat' and obj.tipo != 'texto') else None
+
+
+def index_documents(conn, docs):
+    """Grava [(rowid, texto)] de documentos novos (para reindexar, ``remove_documents`` antes)."""
+    if not docs: return
+    coluna = 'id' if conn.dialect.name == 'postgresql' else 'rowid'
+    conn.execute(text(f'INSERT INTO search_index ({coluna}, body) VALUES (:id, :body)'), [{'id': i, 'body': b} for i, b in docs])
+
+
+def remove_documents(conn, rowids):
+    if not rowids: return
+    coluna = 'id' if conn.dialect.name == 'postgresql' else 'rowid'
+    conn.execute(text(f'DELETE FROM search_index WHERE {coluna} = :id'), [{'id': i} for i in rowids])
+
+
+def index_rows(conn, kind, rows):
+    """Indexa linhas gravadas fora da ORM (INSERT do Core): [(id, dict com os campos)]."""
+    _, code, campos, _ = SOURCES[kind]
+    index_documents(conn, [(i * 4 + code, ' '.join(r.get(c) or '' for c in campos)) for i, r in rows])
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_documents(session, flush_context):
+    docs, removidos = [], []
+    for obj in session.new:
+        if (fonte := _indexable(obj)): docs.append((obj.id * 4 + fonte[1], _body(obj, fonte[2])))
+    for obj in session.dirty:
+        fonte = _BY_MODEL.get(type(obj))
+        if fonte and any(inspect(obj).attrs[c].history.has_changes() for c in fonte[2] + ('tipo',) * (fonte[0] == 'chat')):
+            removidos.append(obj.id * 4 + fonte[1])
+            if _indexable(obj): docs.append((obj.id * 4 + fonte[1], _body(obj, fonte[2])))
+    for obj in session.deleted:
+        if (fonte := _BY_MODEL.get(type(obj))): removidos.append(obj.id * 4 + fonte[1])
+    if docs or removidos:
+        conn = session.connection()
+        remove_documents(conn, removidos)
+        index_documents(conn, docs)
+
+
+def _index_table(conn):
+    return table('search_index', column('id' if conn.dialect.name == 'postgresql' else 'rowid'), column('body'))
+
+
+def rebuild():
+    """Recria o índice inteiro a partir de Lead, ChatMessage, Review e ChatArchive; devolve o total indexado."""
+    conn = db.session.connection()
+    conn.execute(text('DROP TABLE IF EXISTS search_index')) # recriar é mais rápido que apagar linha a linha
+    create_index(conn)
+    t = _index_table(conn)
+    for model, code, campos, filtro in SOURCES.values():
+        partes = [func.coalesce(getattr(model, c), '') for c in campos]
+        corpo = partes[0]
+        for p in partes[1:]: corpo = corpo + ' ' + p
+        q = select(model.id * 4 + code, corpo)
+        conn.execute(insert(t).from_select(list(t.c.keys()), q.where(filtro()) if filtro else q))
+    import chat_archive # chat_archive importa search: aqui dentro evita o ciclo
+    chat_archive.index_all(conn)
+    if conn.dialect.name == 'sqlite': conn.execute(text("INSERT INTO search_index (search_index) VALUES ('optimize')"))
+    total = conn.execute(text('SELECT count(*) FROM search_index')).scalar()
+    db.session.commit()
+    return total
+
+
+def _snippet(trecho):
+    return str(escape(trecho)).replace(_MARK[0], '<mark>').replace(_MARK[1], '</mark>')
+
+
+def search(q, kinds=None, page=1, per_page=20, rank_limit=RANK_LIMIT):
+    """Página ``page`` dos resultados de ``q``: ([resultado], há mais?).
+
+    Cada palavra da busca (de duas letras ou mais) vale como prefixo e todas
+    precisam aparecer. Até ``rank_limit`` ocorrências a ordem é por relevância;
+    acima disso calcular o ranking de todas custaria segundos, então os mais
+    recentes vêm primeiro. O trecho (``snippet``) já vem escapado, com os
+    termos em <mark>.
+    """
+    termos = re.findall(r'\w+', q.lower())[:10]
+    if not termos: return [], False
+    conn = db.session.connection()
+    pg = conn.dialect.name == 'postgresql'
+    chave = 'id' if pg else 'rowid'
+    kinds = set(kinds or SOURCES)
+    codigos = [SOURCES[k][1] for k in kinds] + [ARCHIVE_CODE] * ('chat' in kinds)
+    filtro = '' if kinds >= set(SOURCES) else f'AND {chave} % 4 IN :codigos'
+    if pg:
+        origem, cond = "search_index, to_tsquery('portuguese', :q) AS q", 'tsv @@ q'
+        trecho, rank = "ts_headline('portuguese', body, q, :opcoes)", 'ts_rank_cd(tsv, q) DESC, id DESC'
+        params = {'q': ' & '.join(f'{t}:*' if len(t) > 1 else t for t in termos),
+                  'opcoes': f'StartSel={_MARK[0]}, StopSel={_MARK[1]}, MaxWords=30, MinWords=10'}
+    else:
+        origem, cond = 'search_index', 'search_index MATCH :q'
+        trecho, rank = f"snippet(search_index, 0, '{_MARK[0]}', '{_MARK[1]}', '…', 16)", 'rank'
+        params = {'q': ' '.join(f'"{t}"*' if len(t) > 1 else f'"{t}"' for t in termos)}
+    if filtro: params['codigos'] = codigos
+
+    def _sql(sql):
+        stmt = text(sql)
+        return stmt.bindparams(bindparam('codigos', expanding=True)) if filtro else stmt
+
+    # Conta só até o limite: o índice devolve as ocorrências sem calcular ranking
+    ocorrencias = conn.execute(_sql(f'SELECT count(*) FROM (SELECT 1 FROM {origem} WHERE {cond} {filtro} LIMIT :n) AS t'),
+                               {**params, 'n': rank_limit + 1}).scalar()
+    ordem = rank if ocorrencias <= rank_limit else f'{chave} DESC'
+    stmt = _sql(f'SELECT {chave}, {trecho} FROM {origem} WHERE {cond} {filtro} ORDER BY {ordem} LIMIT :limit OFFSET :offset')
+    linhas = conn.execute(stmt, {**params, 'limit': per_page + 1, 'offset': (page - 1) * per_page}).all()
+    mais, linhas = len(linhas) > per_page, linhas[:per_page]
+
+    # Uma consulta por tipo presente na página para montar os resultados
+    ids = {}
+    for rowid, _ in linhas: ids.setdefault(_KINDS[rowid % 4], []).append(rowid // 4)
+    docs = {}
+    if 'lead' in ids:
+        for l in Lead.query.filter(Lead.id.in_(ids['lead'])):
+            docs[('lead', l.id)] = {'title': l.nome, 'subtitle': l.email, 'date': l.data, 'tab': 'leads'}
+    if 'chat' in ids:
+        for m_id, data, uuid, nome, dono in db.session.query(ChatMessage.id, ChatMessage.data, ChatSession.session_uuid, ChatSession.client_name, ChatSession.user_id) \
+                .join(ChatSession, ChatSession.id == ChatMessage.session_id).filter(ChatMessage.id.in_(ids['chat'])):
+            docs[('chat', m_id)] = {'title': nome, 'subtitle': f'Ticket {uuid[:8]}', 'date': data,
+                                    'tab': 'chat_client' if dono else 'chat_public', 'session_id': uuid}
+    if 'arquivo' in ids:
+        for s_id, uuid, nome, dono, fechada in db.session.query(ChatSession.id, ChatSession.session_uuid, ChatSession.client_name, ChatSession.user_id, ChatSession.closed_at) \
+                .filter(ChatSession.id.in_(ids['arquivo'])):
+            docs[('arquivo', s_id)] = {'kind': 'chat', 'title': nome, 'subtitle': f'Ticket {uuid[:8]} (arquivado)', 'date': fechada,
+                                       'tab': 'chat_client' if dono else 'chat_public', 'session_id': uuid}
+    if 'review' in ids:
+        for r in Review.query.filter(Review.id.in_(ids['review'])):
+            docs[('review', r.id)] = {'title': r.nome, 'subtitle': f"{r.estrelas or 0} estrela(s)", 'date': r.data, 'tab': 'reviews'}
+    resultados = []
+    for rowid, trecho in linhas:
+        chave = (_KINDS[rowid % 4], rowid // 4)
+        if chave in docs: # entrada órfã (DELETE em massa) fica de fora até o próximo rebuild
+            resultados.append({'kind': chave[0], 'id': chave[1], 'snippet': _snippet(trecho), **docs[chave]})
+    return resultados, mais
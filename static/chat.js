@@ -0,0 +1,58 @@
+// --- Canal de push do chat ---
+// Usa Server-Sent Events e cai para long-poll se o navegador não suportar ou a
+// conexão falhar seguidamente. Com o servidor cheio o stream responde 204 e o
+// long-poll vira polling curto no ritmo do Retry-After.
+// onData(novas, status) recebe só mensagens novas.
+function subscribeChat(streamUrl, pollUrl, afterId, onData) {
+  let lastId = afterId;
+  let etag = null;
+  let closed = false;
+  let es = null;
+  let falhas = 0;
+
+  const entregar = (data) => {
+    const novas = data.messages.filter((m) => m.id > lastId);
+    if (novas.length) lastId = novas[novas.length - 1].id;
+    onData(novas, data.status);
+  };
+
+  async function longPoll() {
+    while (!closed) {
+      try {
+        const res = await fetch(`${pollUrl}?after_id=${lastId}&wait=25`, {
+          cache: "no-store",
+          headers: etag ? { "If-None-Match": etag } : {},
+        });
+        if (res.status === 200) {
+          etag = res.headers.get("ETag");
+          entregar(await res.json());
+        } else if (res.status !== 304) throw new Error(res.status);
+        const pausa = Number(res.headers.get("Retry-After"));
+        if (pausa) await new Promise((r) => setTimeout(r, pausa * 1000));
+      } catch (e) {
+        await new Promise((r) => setTimeout(r, 3000));
+      }
+    }
+  }
+
+  if (window.EventSource) {
+    es = new EventSource(`${streamUrl}?after_id=${lastId}`);
+    es.onopen = () => (falhas = 0);
+    es.onmessage = (e) => entregar(JSON.parse(e.data));
+    es.onerror = () => {
+      // CLOSED: o servidor recusou (204), não vai haver reconexão
+      if ((es.readyState === EventSource.CLOSED || ++falhas >= 3) && !closed) {
+        es.close();
+        es = null;
+        longPoll();
+      }
+    };
+  } else longPoll();
+
+  return {
+    close() {
+      closed = true;
+      if (es) es.close();
+    },
+  };
+}
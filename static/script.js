@@ -219,13 +219,16 @@ document.addEventListener("DOMContentLoaded", () => {
   let botState = "idle";
   let tempCategory = "",
     tempName = "";
-  let currentMessageCount = 0;
+  let lastMessageId = 0;
+  let chatSub = null;
+  let watchedSession = null;
   let isUploadingAudio = false;
 
   // Abrir/Fechar Chat
   window.toggleChat = function () {
     chatBox.style.display = chatBox.style.display === "flex" ? "none" : "flex";
     if (chatBox.style.display === "flex") resetToMenu();
+    else watchSession(null);
   };
   if (document.getElementById("chat-toggle"))
     document
@@ -241,7 +244,7 @@ document.addEventListener("DOMContentLoaded", () => {
     statusText.innerText = "Suporte Online";
     botState = "idle";
     localStorage.removeItem("activeSession");
-    currentMessageCount = 0;
+    watchSession(null);
     isUploadingAudio = false;
   };
   if (backBtn) backBtn.addEventListener("click", () => window.resetToMenu());
@@ -285,7 +288,7 @@ document.addEventListener("DOMContentLoaded", () => {
     tempCategory = categoria;
     botState = "waiting_name";
     statusText.innerText = "Atendimento Virtual";
-    currentMessageCount = 0;
+    watchSession(null);
     appendMessage("Olá! Sou o assistente virtual.", "received");
     setTimeout(() => {
       appendMessage(
@@ -306,14 +309,13 @@ document.addEventListener("DOMContentLoaded", () => {
     if (botState === "chatting") {
       const sess = localStorage.getItem("activeSession");
       if (sess) {
-        appendMessage(text, "sent");
+        appendMessage(text, "sent pending");
         chatInput.value = "";
         const fd = new FormData();
         fd.append("message", text);
 
         try {
           await sendMessageBackend(fd, sess);
-          currentMessageCount++;
         } catch (e) {
           console.error("Erro ao enviar", e);
         }
@@ -351,6 +353,7 @@ document.addEventListener("DOMContentLoaded", () => {
           const data = await res.json();
           saveTicketToLocal(data.session_id);
           localStorage.setItem("activeSession", data.session_id);
+          watchSession(data.session_id);
           statusText.innerText = data.ticket;
           setTimeout(() => {
             appendMessage(
@@ -383,7 +386,7 @@ document.addEventListener("DOMContentLoaded", () => {
       if (fileInput.files.length > 0 && sess) {
         const fd = new FormData();
         fd.append("arquivo", fileInput.files[0]);
-        appendMessage(`Arquivo: ${fileInput.files[0].name}`, "sent");
+        appendMessage(`Arquivo: ${fileInput.files[0].name}`, "sent pending");
 
         isUploadingAudio = true;
         chatInput.disabled = true;
@@ -391,7 +394,6 @@ document.addEventListener("DOMContentLoaded", () => {
 
         try {
           await sendMessageBackend(fd, sess);
-          currentMessageCount++;
         } finally {
           isUploadingAudio = false;
           chatInput.disabled = false;
@@ -474,8 +476,6 @@ document.addEventListener("DOMContentLoaded", () => {
 
                 const el = document.getElementById(tempId);
                 if (el) el.remove();
-                currentMessageCount = 0;
-                await loadMessages();
               }
             } catch (err) {
               console.error("Erro no upload do áudio:", err);
@@ -575,47 +575,51 @@ document.addEventListener("DOMContentLoaded", () => {
           localStorage.setItem("activeSession", t.uuid);
           statusText.innerText = t.ticket;
           botState = "chatting";
-          currentMessageCount = 0;
-          loadMessages();
+          watchSession(t.uuid);
         };
         historyList.appendChild(d);
       });
     } catch (e) {}
   };
 
-  // Loop para buscar novas mensagens a cada 3 segundos
-  async function loadMessages() {
-    if (isUploadingAudio || isRecording) return;
-
-    const sess = localStorage.getItem("activeSession");
-    if (!sess || chatInterface.style.display === "none") return;
-
-    try {
-      const res = await fetch(`/get_messages/${sess}`);
-      const data = await res.json();
-
-      if (data.messages.length !== currentMessageCount) {
-        chatBody.innerHTML = "";
-        data.messages.forEach((m) => {
-          let c = m.conteudo;
-          if (m.tipo === "audio")
-            c = `<audio controls src="/static/uploads/${c}"></audio>`;
-          if (m.tipo === "arquivo")
-            c = `<a href="/static/uploads/${c}" target="_blank">Ver Arquivo</a>`;
-          appendMessage(c, m.remetente === "user" ? "sent" : "received", true);
-        });
+  // Assina o canal de push da sessão ativa (SSE, com long-poll de reserva)
+  function watchSession(sess) {
+    watchedSession = sess;
+    if (chatSub) chatSub.close();
+    chatSub = null;
+    lastMessageId = 0;
+    if (sess)
+      chatSub = subscribeChat(
+        `/chat_stream/${sess}`,
+        `/get_messages/${sess}`,
+        0,
+        renderMessages
+      );
+  }
 
-        currentMessageCount = data.messages.length;
+  function renderMessages(novas, status) {
+    if (novas.length) {
+      if (lastMessageId === 0) chatBody.innerHTML = "";
+      chatBody.querySelectorAll(".pending").forEach((el) => el.remove());
+      novas.forEach((m) => {
+        let c = m.conteudo;
+        if (m.tipo === "audio")
+          c = `<audio controls src="${m.url}"></audio>`;
+        if (m.tipo === "arquivo")
+          c = `<a href="${m.url}" target="_blank">Ver Arquivo</a>`;
+        appendMessage(c, m.remetente === "user" ? "sent" : "received", true);
+      });
+      lastMessageId = novas[novas.length - 1].id;
+      if (watchedSession && novas.some((m) => m.remetente === "admin"))
+        fetch(`/chat/${watchedSession}/read`, { method: "POST" });
+    }
 
-        if (data.status === "Encerrado") {
-          chatInput.disabled = true;
-          chatInput.placeholder = "Atendimento encerrado.";
-        } else if (chatInput.disabled && !isUploadingAudio) {
-          chatInput.disabled = false;
-          chatInput.placeholder = "Digite...";
-        }
-      }
-    } catch (e) {}
+    if (status === "Encerrado") {
+      chatInput.disabled = true;
+      chatInput.placeholder = "Atendimento encerrado.";
+    } else if (chatInput.disabled && !isUploadingAudio) {
+      chatInput.disabled = false;
+      chatInput.placeholder = "Digite...";
+    }
   }
-  setInterval(loadMessages, 3000);
 });
@@ -0,0 +1,60 @@
+"""Arquivamento com anexos: o arquivo só sai do disco depois do commit do lote."""
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+_pasta = tempfile.mkdtemp(prefix='test-chat-archive-')
+os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(_pasta, 'test.db')}", MAIL_WORKERS='0', IMPORT_WORKERS='0',
+                  IMPORT_FOLDER=os.path.join(_pasta, 'imports'), UPLOAD_FOLDER=os.path.join(_pasta, 'uploads'),
+                  CHAT_EVENTS_DB=os.path.join(_pasta, 'chat_events.db'), METRICS_DIR=os.path.join(_pasta, 'metrics'),
+                  PAGE_CACHE_VERSION_FILE=os.path.join(_pasta, 'site_version'), USER_CACHE_VERSION_FILE=os.path.join(_pasta, 'users_version'))
+
+from werkzeug.datastructures import FileStorage
+
+from app import app, uploads
+from models import db, ChatSession, ChatMessage, ChatArchive, StoredFile
+import chat_archive
+
+
+@pytest.fixture
+def sessao_com_audio():
+    with app.app_context():
+        db.create_all()
+        path, _ = uploads.save(FileStorage(io.BytesIO(os.urandom(64))), 'webm')
+        antiga = datetime.now() - timedelta(days=400)
+        s = ChatSession(session_uuid=os.urandom(8).hex(), category='Geral', status='Encerrado', created_at=antiga, closed_at=antiga)
+        db.session.add(s)
+        db.session.flush()
+        db.session.add_all([ChatMessage(session_id=s.id, tipo='texto', conteudo='segue o áudio', remetente='user', data=antiga),
+                            ChatMessage(session_id=s.id, tipo='audio', conteudo=path, remetente='user', data=antiga)])
+        db.session.commit()
+        yield s.id, path
+        db.session.rollback()
+
+
+def test_rollback_keeps_attachment(sessao_com_audio, monkeypatch):
+    sid, path = sessao_com_audio
+    def falha():
+        raise RuntimeError('commit falhou')
+    monkeypatch.setattr(db.session, 'commit', falha)
+    with pytest.raises(RuntimeError):
+        chat_archive.archive(days=30)
+    db.session.rollback()
+    monkeypatch.undo()
+
+    assert os.path.exists(uploads.abspath(path))
+    assert db.session.get(StoredFile, path).refcount == 1
+    assert db.session.get(ChatArchive, sid) is None
+    assert db.session.scalar(db.select(db.func.count()).where(ChatMessage.session_id == sid)) == 2
+
+
+def test_commit_removes_attachment(sessao_com_audio):
+    sid, path = sessao_com_audio
+    chat_archive.archive(days=30)
+
+    assert not os.path.exists(uploads.abspath(path))
+    assert db.session.get(StoredFile, path) is None
+    assert [m.tipo for m in chat_archive.read(sid)] == ['texto', 'audio']
@@ -0,0 +1,115 @@
+"""Séries temporais dos clientes: gravação, agregados mensais e downsampling.
+
+``ClientMetric`` guarda um ponto por (cliente, métrica, instante); o índice
+único (user_id, metric, ts) atende às consultas por intervalo. ``record`` grava
+pontos com upsert em lote e recalcula na mesma transação os meses tocados em
+``ClientMetricMonthly`` (contagem, soma, mínimo e máximo), com uma consulta
+agrupada por lote.
+
+``series`` devolve um intervalo com no máximo ``points`` pontos: até esse
+número sai o dado bruto; acima, o bruto é reduzido por LTTB (Largest Triangle
+Three Buckets, que mantém picos e vales do gráfico); e se o intervalo passa de
+``raw_limit`` pontos a série vem dos agregados mensais, sem ler o bruto.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select, tuple_
+
+from models import db, upsert, ClientMetric, ClientMetricMonthly
+
+RAW_LIMIT = 20000
+
+
+def _month(col, dialect):
+    """Expressão 'AAAA-MM' da coluna de data no banco."""
+    if dialect == 'postgresql': return func.to_char(col, 'YYYY-MM')
+    return func.strftime('%Y-%m', col)
+
+
+def _month_bounds(mes):
+    ano, m = map(int, mes.split('-'))
+    return datetime(ano, m, 1), datetime(ano + m // 12, m % 12 + 1, 1)
+
+
+def _aggregate(t, mes):
+    return (t.c.user_id, t.c.metric, mes, func.count(), func.sum(t.c.value), func.min(t.c.value), func.max(t.c.value))
+
+
+def refresh_monthly(conn, meses):
+    """Recalcula os agregados dos (user_id, metric, 'AAAA-MM') de ``meses``."""
+    if not meses: return
+    t = ClientMetric.__table__
+    mes = _month(t.c.ts, conn.dialect.name)
+    inicio = min(_month_bounds(m)[0] for _, _, m in meses)
+    fim = max(_month_bounds(m)[1] for _, _, m in meses)
+    pares = {(u, m) for u, m, _ in meses}
+    linhas = conn.execute(select(*_aggregate(t, mes)).where(tuple_(t.c.user_id, t.c.metric).in_(pares), t.c.ts >= inicio, t.c.ts < fim)
+                          .group_by(t.c.user_id, t.c.metric, mes))
+    upsert(ClientMetricMonthly, ['user_id', 'metric', 'month'],
+           [{'user_id': u, 'metric': m, 'month': ms, 'count': n, 'total': s, 'min': lo, 'max': hi}
+            for u, m, ms, n, s, lo, hi in linhas if (u, m, ms) in meses], conn=conn)
+
+
+def record(points, conn=None):
+    """Grava pontos {user_id, metric, ts, value} (repetidos no lote: vale o último) e atualiza os meses tocados."""
+    conn = conn if conn is not None else db.session.connection()
+    por_chave = {(p['user_id'], p['metric'], p['ts']): p for p in points}
+    upsert(ClientMetric, ['user_id', 'metric', 'ts'], [{'user_id': u, 'metric': m, 'ts': ts, 'value': p['value']} for (u, m, ts), p in por_chave.items()], conn=conn)
+    refresh_monthly(conn, {(u, m, ts.strftime('%Y-%m')) for u, m, ts in por_chave})
+
+
+def rebuild_monthly():
+    """Recalcula todos os agregados mensais a partir de ClientMetric."""
+    t = ClientMetric.__table__
+    mes = _month(t.c.ts, db.engine.dialect.name)
+    db.session.execute(delete(ClientMetricMonthly))
+    db.session.execute(insert(ClientMetricMonthly).from_select(['user_id', 'metric', 'month', 'count', 'total', 'min', 'max'],
+                                                              select(*_aggregate(t, mes)).group_by(t.c.user_id, t.c.metric, mes)))
+    db.session.commit()
+
+
+def lttb(xs, ys, alvo):
+    """Índices dos ``alvo`` pontos escolhidos pelo LTTB em (xs, ys), com xs crescente."""
+    n = len(xs)
+    if alvo >= n or alvo < 3: return list(range(n))
+    largura = (n - 2) / (alvo - 2)
+    escolhidos, a = [0], 0
+    for i in range(alvo - 2):
+        inicio, fim = int(i * largura) + 1, int((i + 1) * largura) + 1
+        prox_fim = min(int((i + 2) * largura) + 1, n)
+        mx = sum(xs[fim:prox_fim]) / (prox_fim - fim) # média do bucket seguinte
+        my = sum(ys[fim:prox_fim]) / (prox_fim - fim)
+        ax, ay = xs[a], ys[a]
+        a = max(range(inicio, fim), key=lambda j: abs((ax - mx) * (ys[j] - ay) - (ax - xs[j]) * (my - ay)))
+        escolhidos.append(a)
+    escolhidos.append(n - 1)
+    return escolhidos
+
+
+def monthly(user_id, metric, inicio=None, fim=None):
+    """Agregados mensais [{month, count, total, avg, min, max}] dos meses que tocam [inicio, fim)."""
+    q = select(ClientMetricMonthly).where(ClientMetricMonthly.user_id == user_id, ClientMetricMonthly.metric == metric)
+    if inicio: q = q.where(ClientMetricMonthly.month >= inicio.strftime('%Y-%m'))
+    if fim: q = q.where(ClientMetricMonthly.month <= (fim - timedelta(microseconds=1)).strftime('%Y-%m'))
+    return [{'month': m.month, 'count': m.count, 'total': m.total, 'avg': m.total / m.count if m.count else None, 'min': m.min, 'max': m.max}
+            for m in db.session.scalars(q.order_by(ClientMetricMonthly.month))]
+
+
+def series(user_id, metric, inicio=None, fim=None, points=300, raw_limit=RAW_LIMIT):
+    """(resolução, [(instante, valor)]) do intervalo [inicio, fim) com no máximo ``points`` pontos.
+
+    A resolução é 'raw' (dado bruto), 'lttb' (bruto reduzido) ou 'monthly' (média de cada mês).
+    """
+    filtro = [ClientMetric.user_id == user_id, ClientMetric.metric == metric]
+    if inicio: filtro.append(ClientMetric.ts >= inicio)
+    if fim: filtro.append(ClientMetric.ts < fim)
+    total = db.session.scalar(select(func.count()).select_from(ClientMetric).where(*filtro))
+    if total > raw_limit:
+        pontos = [(_month_bounds(m['month'])[0], m['avg']) for m in monthly(user_id, metric, inicio, fim)]
+        resolucao = 'monthly'
+    else:
+        pontos = db.session.execute(select(ClientMetric.ts, ClientMetric.value).where(*filtro).order_by(ClientMetric.ts)).all()
+        resolucao = 'raw' if total <= points else 'lttb'
+    if len(pontos) <= points: return resolucao, [tuple(p) for p in pontos]
+    indices = lttb([p[0].timestamp() for p in pontos], [p[1] for p in pontos], points)
+    return resolucao, [tuple(pontos[i]) for i in indices]
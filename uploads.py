@@ -0,0 +1,143 @@
+"""Armazenamento de uploads endereçado por conteúdo, e links assinados para download.
+
+Cada arquivo é gravado uma única vez em ``UPLOAD_FOLDER/ab/cd/<sha256>.<ext>``
+(dois níveis de subpastas pelo hash) e tem um contador de referências em
+``StoredFile``. Arquivos repetidos (a mesma imagem em vários cases, o mesmo
+anexo reenviado) só incrementam o contador; ``release`` apaga o arquivo quando
+o contador chega a zero.
+
+O contador sobe antes de o arquivo ir para o lugar definitivo e desce com um
+UPDATE atômico; com o contador em zero o registro sai na transação e o arquivo
+só depois do commit dela (num rollback o registro volta e o arquivo continua
+lá). Se um ``save`` concorrente do mesmo conteúdo recriou o registro nesse
+meio-tempo, o arquivo fica: é dele.
+"""
+import hashlib
+import os
+import uuid
+
+from flask import current_app, has_app_context, url_for
+from itsdangerous import URLSafeTimedSerializer, BadSignature
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from models import db, upsert_increment, StoredFile
+
+CHUNK_SIZE = 64 * 1024
+
+
+@event.listens_for(Session, 'after_commit')
+def _remove_on_commit(session):
+    removidos = session.info.pop('uploads_removed', None)
+    if not removidos or not has_app_context(): return
+    t = StoredFile.__table__
+    with db.engine.connect() as conn:
+        voltaram = set(conn.scalars(select(t.c.path).where(t.c.path.in_(list(removidos)))))
+    for path, arquivo in removidos.items():
+        if path in voltaram: continue
+        try: os.remove(arquivo)
+        except FileNotFoundError: pass
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_on_rollback(session):
+    session.info.pop('uploads_removed', None)
+
+
+def save_stream(file, dest_path):
+    """Copia o upload para ``dest_path`` em blocos, calculando o SHA-256 no mesmo passo.
+
+    A memória usada é a de um bloco, qualquer que seja o tamanho do arquivo. Grava
+    num ``.part`` e renomeia no fim, então nunca fica um arquivo pela metade no
+    lugar definitivo. Devolve (tamanho, sha256).
+    """
+    h = hashlib.sha256()
+    size = 0
+    tmp = dest_path + '.part'
+    try:
+        with open(tmp, 'wb') as out:
+            while chunk := file.stream.read(CHUNK_SIZE):
+                out.write(chunk)
+                h.update(chunk)
+                size += len(chunk)
+        os.replace(tmp, dest_path)
+    except BaseException:
+        if os.path.exists(tmp): os.remove(tmp)
+        raise
+    return size, h.hexdigest()
+
+
+class UploadStore:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config['UPLOAD_FOLDER']
+        self.tmp = os.path.join(self.root, '.tmp')
+        os.makedirs(self.tmp, exist_ok=True)
+        # Dentro de static/ o arquivo sai pela rota static; fora dela, por /uploads (uploaded_file em app.py)
+        rel = os.path.relpath(self.root, app.static_folder)
+        fora = rel == os.pardir or rel.startswith(os.pardir + os.sep)
+        self.static_prefix = None if fora else '' if rel == os.curdir else rel.replace(os.sep, '/') + '/'
+        app.extensions['upload_store'] = self
+
+    def save(self, file, ext):
+        """Grava o upload (ou reaproveita o já existente) e soma uma referência.
+
+        O contador entra na transação atual; quem chama faz o commit. Devolve
+        (caminho relativo, tamanho).
+        """
+        tmp = os.path.join(self.tmp, uuid.uuid4().hex)
+        size, sha = save_stream(file, tmp)
+        path = f"{sha[:2]}/{sha[2:4]}/{sha}.{ext.lower()}"
+        destino = self.abspath(path)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        # A referência primeiro: um release concorrente do mesmo arquivo espera esta transação
+        upsert_increment(StoredFile, ['path'], [{'path': path, 'size': size, 'refcount': 1}], col='refcount')
+        # Se já existe, o conteúdo é idêntico: o rename só troca um pelo outro
+        os.replace(tmp, destino)
+        return path, size
+
+    def release(self, path, commit=True):
+        """Tira uma referência; com zero, remove o registro e o arquivo. Devolve se removeu.
+
+        Com ``commit=False`` entra na transação de quem chama, que faz o commit.
+        O arquivo só é apagado depois desse commit.
+        """
+        t = StoredFile.__table__
+        restante = db.session.execute(update(t).where(t.c.path == path).values(refcount=t.c.refcount - 1).returning(t.c.refcount)).scalar()
+        removido = restante is not None and restante <= 0 and \
+            db.session.execute(delete(t).where(t.c.path == path, t.c.refcount <= 0)).rowcount > 0
+        if removido: db.session.info.setdefault('uploads_removed', {})[path] = self.abspath(path)
+        if commit: db.session.commit()
+        return removido
+
+    def abspath(self, path):
+        return os.path.join(self.root, *path.split('/'))
+
+    def url(self, path):
+        if self.static_prefix is None: return url_for('uploaded_file', path=path)
+        return url_for('static', filename=self.static_prefix + path)
+
+    def path_from_url(self, url):
+        """Caminho no store de uma URL gerada por ``url``; None para URLs externas ou antigas."""
+        prefixo = self.url('_')[:-1]
+        if not url or not url.startswith(prefixo): return None
+        path = url[len(prefixo):]
+        return path if db.session.get(StoredFile, path) else None
+
+
+def _serializer():
+    return URLSafeTimedSerializer(current_app.secret_key, salt='upload-link')
+
+
+def sign_upload(path, name):
+    return _serializer().dumps({'p': path, 'n': name})
+
+
+def unsign_upload(token, max_age):
+    """(caminho, nome original) do token, ou None se a assinatura for inválida ou tiver expirado."""
+    try: d = _serializer().loads(token, max_age=max_age)
+    except BadSignature: return None
+    return (d['p'], d['n']) if isinstance(d, dict) else None
@@ -0,0 +1,126 @@
+"""Cache do user_loader do Flask-Login.
+
+Todo request autenticado (inclusive o poll do chat a cada 3 s) buscava o User
+pela chave primária. ``UserCache`` guarda um retrato leve e imutável
+(``UserSnapshot``: id, username, name, role) por até USER_CACHE_TTL segundos,
+num LRU de no máximo USER_CACHE_SIZE usuários por worker.
+
+A invalidação segue o esquema do cache de páginas (page_cache.py): a versão é
+o conteúdo de ``instance/users_version`` (um uuid novo a cada troca; o mtime
+repetiria o valor em duas trocas no mesmo instante), e um commit que cria,
+altera ou apaga User (pela ORM, por UPDATE/DELETE em massa, como em
+delete_client, ou pelo Core com ``invalidate``, como na importação de
+clientes) troca o arquivo; todos os workers descartam os retratos no request
+seguinte. Acertos e faltas vão para o /metrics em ``user_cache_lookups_total``.
+"""
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, has_app_context
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import User
+
+
+class UserSnapshot(UserMixin, namedtuple('UserSnapshot', 'id username name role')):
+    __slots__ = ()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_users(session, flush_context):
+    for objs in (session.new, session.dirty, session.deleted):
+        if any(isinstance(o, User) for o in objs):
+            session.info['user_cache_dirty'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_bulk(state):
+    # User.query.filter_by(...).delete() não passa pelo flush
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None and state.bind_mapper.class_ is User:
+        state.session.info['user_cache_dirty'] = True
+
+
+def invalidate(session):
+    """Para gravações em User pelo Core (``conn.execute``), que os listeners não
+    enxergam: a versão troca no commit da ``session``, como nas gravações pela ORM."""
+    session.info['user_cache_dirty'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_on_commit(session):
+    if session.info.pop('user_cache_dirty', False) and has_app_context():
+        cache = current_app.extensions.get('user_cache')
+        if cache: cache.bump()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_on_rollback(session):
+    session.info.pop('user_cache_dirty', None)
+
+
+class UserCache:
+    def __init__(self, app=None):
+        self._users = OrderedDict() # id -> (expira em, retrato ou None)
+        self._lock = threading.Lock()
+        self._version = None
+        self.hits = self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('USER_CACHE_VERSION_FILE') or os.path.join(app.instance_path, 'users_version')
+        self.ttl = app.config.get('USER_CACHE_TTL', 60)
+        self.size = app.config.get('USER_CACHE_SIZE', 1024)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if not os.path.exists(self.path): self.bump()
+        app.extensions['user_cache'] = self
+
+    def version(self):
+        try:
+            with open(self.path) as fp: return fp.read().strip() or '0'
+        except FileNotFoundError: return '0'
+
+    def bump(self):
+        """Troca o arquivo de versão (escrita atômica); vale para todos os workers."""
+        tmp = f"{self.path}.{uuid.uuid4().hex}"
+        with open(tmp, 'w') as fp: fp.write(uuid.uuid4().hex)
+        os.replace(tmp, self.path)
+
+    def _count(self, resultado):
+        metrics = current_app.extensions.get('metrics') if has_app_context() else None
+        if metrics: metrics.inc('user_cache_lookups_total', (('result', resultado),))
+
+    def get(self, user_id, load):
+        """Retrato do usuário ``user_id`` (None se não existe); ``load(user_id)`` só roda na falta."""
+        versao = self.version() # lida antes de carregar: um bump no meio invalida de novo
+        agora = time.monotonic()
+        with self._lock:
+            if versao != self._version:
+                self._users.clear()
+                self._version = versao
+            item = self._users.get(user_id)
+            if item and item[0] > agora:
+                self._users.move_to_end(user_id)
+                self.hits += 1
+            else:
+                item = None
+                self.misses += 1
+        self._count('hit' if item else 'miss')
+        if item: return item[1]
+        u = load(user_id)
+        retrato = UserSnapshot(u.id, u.username, u.name, u.role) if u else None
+        with self._lock:
+            if self._version == versao:
+                self._users[user_id] = (agora + self.ttl, retrato)
+                self._users.move_to_end(user_id)
+                while len(self._users) > self.size: self._users.popitem(last=False)
+        return retrato
+
+    def clear(self):
+        with self._lock: self._users.clear()